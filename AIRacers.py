@@ -9,10 +9,15 @@ Example:
         $ python AIRacers.py -t track1 play
 """
 import argparse
-import pygame
+import budget
+import datetime
+import json
+import random
+import time
+import curriculum
+import kernels
+import registry
 import simulator
-from controller1.controller import Controller
-from controller2.controller import Controller as Controller2
 import tracks_config as track
 
 
@@ -20,6 +25,7 @@ def play(track, bot_type) -> None:
     """
     Launches the simulator in a mode where the player can control each action with the arrow keys.
     """
+    import pygame
     game_state = simulator.Simulation(track, bot_type)
     while True:
         events = pygame.event.get()
@@ -31,34 +37,30 @@ def play(track, bot_type) -> None:
                     feedback = game_state.frame_step(direction)
                     print("sensors  " + str(feedback))
                     print("position " + str(game_state.car1.car_body.position))
-                    print("color: " + str(simulator.get_point_from_rgb_list(int(game_state.car1.car_body.position[0])
-                                                                            , int(game_state.car1.car_body.position[1])
-                                                                            , game_state.car1.track_rgb)))
+                    print("track class: " + str(kernels.lookup(game_state.car1.track_classes, simulator.get_pixel_index(
+                        int(game_state.car1.car_body.position[0]), int(game_state.car1.car_body.position[1])))))
                 elif event.key == pygame.K_LEFT:
                     direction = 2
                     feedback = game_state.frame_step(direction)
                     print("sensors  " + str(feedback))
                     print("position " + str(game_state.car1.car_body.position))
-                    print("color: " + str(simulator.get_point_from_rgb_list(int(game_state.car1.car_body.position[0])
-                                                                            , int(game_state.car1.car_body.position[1])
-                                                                            , game_state.car1.track_rgb)))
+                    print("track class: " + str(kernels.lookup(game_state.car1.track_classes, simulator.get_pixel_index(
+                        int(game_state.car1.car_body.position[0]), int(game_state.car1.car_body.position[1])))))
                 elif event.key == pygame.K_UP:
                     direction = 3
                     feedback = game_state.frame_step(direction)
                     print("sensors  " + str(feedback))
                     print("position " + str(game_state.car1.car_body.position))
-                    print("color: " + str(simulator.get_point_from_rgb_list(int(game_state.car1.car_body.position[0])
-                                                                            , int(game_state.car1.car_body.position[1])
-                                                                            , game_state.car1.track_rgb)))
+                    print("track class: " + str(kernels.lookup(game_state.car1.track_classes, simulator.get_pixel_index(
+                        int(game_state.car1.car_body.position[0]), int(game_state.car1.car_body.position[1])))))
 
                 elif event.key == pygame.K_DOWN:
                     direction = 4
                     feedback = game_state.frame_step(direction)
                     print("sensors  " + str(feedback))
                     print("position " + str(game_state.car1.car_body.position))
-                    print("color: " + str(simulator.get_point_from_rgb_list(int(game_state.car1.car_body.position[0])
-                                                                            , int(game_state.car1.car_body.position[1])
-                                                                            , game_state.car1.track_rgb)))
+                    print("track class: " + str(kernels.lookup(game_state.car1.track_classes, simulator.get_pixel_index(
+                        int(game_state.car1.car_body.position[0]), int(game_state.car1.car_body.position[1])))))
 
                 if event.key == pygame.K_q:
                     exit()
@@ -67,6 +69,168 @@ def play(track, bot_type) -> None:
         pass
 
 
+def print_match(results: list) -> None:
+    """
+    Reports the races of a competition between 'Player 1' and 'Player 2', in order.
+    """
+    import tournament
+    player_1_score = 0
+    player_2_score = 0
+    switched = False
+
+    for result in results:
+
+        if result.switched and not switched:
+            print("Switching sides...\n")
+            switched = True
+
+        if result.seed is None:
+            print("Race in %s\n" % result.track_name)
+        else:
+            print("Race in %s (seed %d)\n" % (result.track_name, result.seed))
+
+        print("Player 1 score: %d" % result.score_1)
+        print("Player 2 score: %d" % result.score_2)
+
+        if result.winner == 'Player 1':
+            print("Player 1 wins and received %dpts" % tournament.POINTS_PER_WIN)
+            player_1_score += tournament.POINTS_PER_WIN
+        elif result.winner == 'Player 2':
+            print("Player 2 wins and received %dpts" % tournament.POINTS_PER_WIN)
+            player_2_score += tournament.POINTS_PER_WIN
+        else:
+            print("Oh no, it's a tie!")
+
+        print("Player 1 points: %d" % player_1_score)
+        print("Player 2 points: %d" % player_2_score)
+
+    if player_1_score > player_2_score:
+        print("Player 1 wins!")
+    elif player_1_score < player_2_score:
+        print("Player 2 wins!")
+    else:
+        print("Oh no! It's a tie!")
+
+
+def print_round_robin(points: dict, results: list) -> None:
+    """
+    Reports every race of a round-robin competition followed by the final standings.
+    """
+    for result in results:
+        print("%s vs %s in %s%s%s: %d x %d" % (result.player_1, result.player_2, result.track_name,
+                                               " (switched)" if result.switched else "",
+                                               "" if result.seed is None else " (seed %d)" % result.seed,
+                                               result.score_1, result.score_2))
+
+    print("\nStandings:")
+    for name in sorted(points, key=points.get, reverse=True):
+        print("%s: %d" % (name, points[name]))
+
+
+def learning_options(arguments: argparse.Namespace) -> dict:
+    """
+    :return: the keyword arguments configuring the learning of controller1, among which the ones the controller selected
+             with -c takes
+    """
+    def first(value):
+        return value[0] if isinstance(value, list) else value
+
+    options = {'atten': first(arguments.myopia), 'alpha': first(arguments.alpha),
+               'init_temp': first(arguments.initial_temp), 'strategy': first(arguments.strategy)}
+    if arguments.trace_decay is not None:
+        options['trace_decay'] = arguments.trace_decay[0]
+    if arguments.alpha_visits is not None:
+        options['alpha_visits'] = arguments.alpha_visits[0]
+    if arguments.convergence is not None:
+        # Imported here: the command line only imports controller packages through the registry
+        from controller1.convergence import ConvergenceMonitor
+        options['convergence'] = ConvergenceMonitor(max(1, arguments.convergence[0]),
+                                                    *(arguments.convergence_thresholds or ()))
+    return registry.accepted_options(arguments.c[0], options)
+
+
+def check_learner(p: argparse.ArgumentParser, arguments: argparse.Namespace) -> None:
+    """
+    Exits with a usage error unless the controller selected with -c can learn the way the learning mode needs it to.
+    """
+    name = arguments.c[0]
+    try:
+        learns = registry.can_learn(name)
+    except (ImportError, AttributeError, ValueError) as error:
+        p.error(str(error))
+    if not learns:
+        p.error("%s cannot learn: it does not implement update_q" % name)
+
+    if arguments.mode == 'learn' and arguments.j is not None and arguments.j[0] > 1:
+        import hogwild
+        if not hogwild.shares_table(registry.create(name, None, **learning_options(arguments))):
+            p.error("%s cannot learn with several workers: only controller1 tables can be shared" % name)
+    elif arguments.mode in ('sweep', 'pbt'):
+        import sweep
+        searched = {sweep.PARAMETERS[spec.partition('=')[0]][0]: None for spec in arguments.space
+                    if spec.partition('=')[0] in sweep.PARAMETERS}
+        ignored = set(searched) - set(registry.accepted_options(name, searched))
+        if ignored:
+            p.error("%s does not take the searched options: %s" % (name, ', '.join(sorted(ignored))))
+
+
+def player_submission(spec: str, index: int) -> 'tournament.Submission':
+    """
+    :param spec: CONTROLLER or CONTROLLER=TABLE
+    :param index: position of the player in the command line, used to tell players apart
+    :return: the corresponding tournament submission
+    """
+    import tournament
+    controller, _, table_path = spec.partition('=')
+    return tournament.Submission('%d:%s' % (index + 1, spec), controller, table_path or None)
+
+
+def print_scores(table_path: str, responses) -> None:
+    """
+    Reports the scores the evaluation service sends back for a table.
+    """
+    print(table_path)
+    for response in responses:
+        if response.get('done'):
+            if 'error' in response:
+                print("    error: %s" % response['error'])
+            elif response['mean'] is not None:
+                print("    mean: %.1f over %d races" % (response['mean'], response['races']))
+        elif 'error' in response:
+            print("    %s%s: error: %s" % (response['track'], "" if response['seed'] is None else
+                                          " (seed %d)" % response['seed'], response['error']))
+        else:
+            print("    %s%s: %.1f" % (response['track'], "" if response['seed'] is None else
+                                      " (seed %d)" % response['seed'], response['score']))
+
+
+def print_report(report: 'evaluation.Report') -> None:
+    """
+    Prints the statistics of a table, track by track and over every race.
+    """
+    def line(label, statistics):
+        score = statistics['score']
+        print("    %-12s score %8.1f +- %6.1f [%8.1f, %8.1f]  checkpoints %5.1f  grass frames %6.1f  (%d races)"
+              % (label, score['mean'], score['stdev'], score['min'], score['max'], statistics['checkpoints']['mean'],
+                 statistics['grass_frames']['mean'], statistics['races']))
+
+    print(report.table_path)
+    for track_name in report.track_names:
+        line(track_name, report.statistics(track_name))
+    line('overall', report.statistics())
+
+
+def add_service_arguments(subparser: argparse.ArgumentParser) -> None:
+    """
+    Adds the options locating the evaluation service.
+    """
+    # The default port is evaluation_service.DEFAULT_PORT, which is only imported by the modes using the service
+    subparser.add_argument('--port', nargs=1, type=int,
+                           help='Specifies the localhost port of the evaluation service; by default, 5555.\n')
+    subparser.add_argument('--socket', nargs=1,
+                           help='Uses the given Unix socket for the evaluation service instead of a port.\n')
+
+
 def parser() -> (argparse.Namespace, list):
     """
     Parses command line arguments.
@@ -83,6 +247,12 @@ def parser() -> (argparse.Namespace, list):
                         'Check the \'tracks.py\' file to see the available tracks/create new ones.\n')
     p.add_argument('-f', nargs=1,
                    help='Specifies the file you want to load your Qtable.\n')
+    p.add_argument('-c', nargs=1, default=['controller1'],
+                   help='Specifies the controller to learn, evaluate or race: a registered name (controller1, '
+                        'controller2, planner, ...), an installed \'%s\' entry point or a \'module:attribute\' path; '
+                        'by default, controller1 will be used. Learning modes need a controller implementing update_q '
+                        '(and a controller1 table with -j), and only give it the learning options it takes.\n'
+                        % registry.ENTRY_POINT_GROUP)
     p.add_argument('-e', nargs=1, type=int,
                    help="Specifies the number of races/episodes that will be executed in learning mode, the default "
                         "value is 100.\n")
@@ -90,12 +260,59 @@ def parser() -> (argparse.Namespace, list):
                    help='Specifies the myopia factor (as in, the attenuation factor) of the algorithm.\n')
     p.add_argument('--alpha', nargs=1, type=float, default=0.5,
                    help='Specifies the alpha factor of the algorithm.\n')
+    p.add_argument('--trace-decay', nargs=1, type=float,
+                   help='Specifies the lambda of Q(lambda): rewards are credited to the recent states along the '
+                        'greedy path, with weights decaying by myopia * lambda per frame; by default, 0 (one-step '
+                        'Q-learning).\n')
+    p.add_argument('--alpha-visits', nargs=1, type=int,
+                   help='Makes the alpha factor of each state decay with its number of visits, halving after the given '
+                        'number of visits; by default, alpha is constant.\n')
+    p.add_argument('--convergence', nargs=1, type=int,
+                   help='Stops learning once the Q-table has stayed below every --convergence-thresholds for the given '
+                        'number of consecutive episodes; by default, learning runs for every episode.\n')
+    # The default thresholds are the ones of controller1.convergence, which is only imported when learning
+    p.add_argument('--convergence-thresholds', nargs=3, type=float, metavar=('MAX', 'MEAN', 'CHANGES'),
+                   help='Specifies the largest and mean absolute change of the Q-values in an episode, and the '
+                        'fraction of the states visited in the episode whose best action changed, below which an '
+                        'episode counts towards --convergence; by default, 1.0 0.05 0.001.\n')
     p.add_argument('--strategy', nargs=1, choices=['epsilon', 'boltzmann'], default='boltzmann',
                    help='Selects the exploration strategy.\n')
     p.add_argument('--initial-temp', nargs=1, type=float, default=90.0,
                    help='Specifies the initial temperature of the boltzmann function.\n')
+    p.add_argument('--curriculum', nargs=1, choices=sorted(curriculum.CURRICULA),
+                   help='Learns on every track instead of a single one, picking the track of each episode with the '
+                        'given curriculum: every track in turn (round_robin), mostly the tracks with the worst recent '
+                        'scores (weighted) or adding tracks from the easiest to the hardest (staged).\n')
     p.add_argument('--csv', nargs=1, type=str, default=["learning_progress"],
                    help='Specifies the name of the .csv file where the learning progress will be saved.\n')
+    p.add_argument('--checkpoint', nargs=1,
+                   help='Saves the whole learning state (table, exploration, random generators, progress) to the given '
+                        'file every --checkpoint-interval seconds, when done and when interrupted, so that the run can '
+                        'be resumed with --resume.\n')
+    # The default is checkpoint.DEFAULT_INTERVAL, which is only imported by learn mode
+    p.add_argument('--checkpoint-interval', nargs=1, type=float,
+                   help='Specifies the number of seconds between two checkpoints; by default, 300.\n')
+    p.add_argument('--resume', nargs=1,
+                   help='Goes on with the learning run saved in the given checkpoint, which keeps being updated (unless '
+                        '--checkpoint says otherwise). The track, bot and controller are the ones of the run; -e '
+                        'changes its total number of episodes and --time-budget the time it has left.\n')
+    p.add_argument('--time-budget', nargs=1, type=float,
+                   help='Learns for at most the given number of seconds, final saves included, stopping after -e '
+                        'episodes only if -e is given.\n')
+    p.add_argument('-j', nargs=1, type=int,
+                   help='Specifies the number of worker processes used to run races in parallel; by default, one per '
+                        'CPU in competition mode and a single process in learning mode. When learning with several '
+                        'workers, all of them update the same Q-table.\n')
+    p.add_argument('--lock-stripes', nargs=1, type=int, default=[0],
+                   help='Makes the Q-table updates of parallel learners atomic, using the given number of locks; by '
+                        'default, updates are lock-free.\n')
+    # The report mode default is evaluation.DEFAULT_SEEDS, which is only imported by that mode
+    p.add_argument('--seeds', nargs=1, type=int,
+                   help='Specifies how many bomb layouts (seeded 0, 1, ...) each race is run with in competition, score '
+                        'and report modes; by default, each race uses a single random layout (5 layouts in report '
+                        'mode).\n')
+    p.add_argument('--render', action='store_true',
+                   help='Renders competition races on screen, one at a time.\n')
     mode_p.add_parser('learn',
                       help='Starts %(prog)s in learning mode. This mode does not render the game to your screen, '
                            'resulting in faster learning.\n')
@@ -105,10 +322,73 @@ def parser() -> (argparse.Namespace, list):
     mode_p.add_parser('play',
                       help='Starts %(prog)s in playing mode. You can control each action of the car using the arrow '
                            'keys of your keyboard.\n')
-    mode_p.add_parser('comp',
-                      help='Starts %(prog)s in competition mode.\n')
+    mode_p.add_parser('prepare-tracks',
+                      help='Bakes the mask of every track (or of the track selected with -t) into cache files next to '
+                           'it, which simulations load much faster.\n')
+    serve_p = mode_p.add_parser('serve',
+                                help='Starts an evaluation service, which keeps every track loaded in -j worker '
+                                     'processes and scores the tables sent with the score mode.\n')
+    add_service_arguments(serve_p)
+    score_p = mode_p.add_parser('score',
+                                help='Scores tables of the controller selected with -c on every track (or on the '
+                                     'track selected with -t) using a running evaluation service.\n')
+    score_p.add_argument('tables', nargs='+',
+                         help='Tables to score.\n')
+    add_service_arguments(score_p)
+    report_p = mode_p.add_parser('report',
+                                 help='Races tables of the controller selected with -c headlessly on every track (or '
+                                      'on the track selected with -t) for each of the --seeds bomb layouts, in -j '
+                                      'worker processes, and reports their statistics from the best table to the '
+                                      'worst.\n')
+    report_p.add_argument('tables', nargs='*',
+                          help='Tables to evaluate; by default, every table saved in params/.\n')
+    report_p.add_argument('--json', nargs=1,
+                          help='Also saves the reports to the given JSON file.\n')
+    sweep_p = mode_p.add_parser('sweep',
+                                help='Trains a new table of the controller selected with -c for every combination of '
+                                     'learning options of a search space, -e episodes each, in -j worker processes, '
+                                     'and saves the results of every trial to a single table in results/.\n')
+    sweep_p.add_argument('space', nargs='+',
+                         help='Search space, as NAME=V1,V2,... or NAME=LOW:HIGH (random search only) with NAME in '
+                              'myopia, alpha, initial-temp, strategy, trace-decay or alpha-visits. Options left out of '
+                              'the search space are set by the usual arguments (--alpha, ...).\n')
+    sweep_p.add_argument('--trials', nargs=1, type=int,
+                         help='Runs the given number of random trials instead of every combination.\n')
+    sweep_p.add_argument('--halving', nargs=1, type=int,
+                         help='Stops unpromising trials early with asynchronous successive halving: after the given '
+                              'number of episodes, and then every time this number is multiplied by --eta, only the '
+                              'trials with the best recent scores go on. By default, every trial runs -e episodes.\n')
+    sweep_p.add_argument('--eta', nargs=1, type=int, default=[3],
+                         help='Specifies the reduction factor of successive halving: 1 trial out of eta goes on at '
+                              'each step; by default, 3.\n')
+    sweep_p.add_argument('--seed', nargs=1, type=int,
+                         help='Seeds trial i with the given seed + i; by default, trials are not seeded.\n')
+    pbt_p = mode_p.add_parser('pbt',
+                              help='Trains a population of tables of the controller selected with -c, -e episodes '
+                                   'each, in -j worker processes. Every --interval episodes, the members learning '
+                                   'worst go on from a copy of one of the best members, with its learning options '
+                                   'perturbed.\n')
+    pbt_p.add_argument('space', nargs='*',
+                       help='Initial learning options of the members, drawn at random from a search space given as '
+                            'for the sweep mode; by default, every member starts with the usual arguments '
+                            '(--alpha, ...).\n')
+    pbt_p.add_argument('--population', nargs=1, type=int, default=[8],
+                       help='Specifies the number of members of the population; by default, 8.\n')
+    pbt_p.add_argument('--interval', nargs=1, type=int, default=[10],
+                       help='Specifies the number of episodes between two comparisons of a member with the rest of '
+                            'the population; by default, 10.\n')
+    pbt_p.add_argument('--seed', nargs=1, type=int,
+                       help='Seeds member i with the given seed + i; by default, members are not seeded.\n')
+    comp_p = mode_p.add_parser('comp',
+                               help='Starts %(prog)s in competition mode.\n')
+    comp_p.add_argument('players', nargs='*', default=['controller1', 'controller2'],
+                        help='Controllers taking part in the competition, as CONTROLLER or CONTROLLER=TABLE (see -c); '
+                             'by default, controller1 races controller2. With more than two players, every pair of '
+                             'players races each other.\n')
     arguments, leftovers = p.parse_known_args()
     p.parse_args()
+    if arguments.mode in ('learn', 'sweep', 'pbt') and arguments.resume is None:
+        check_learner(p, arguments)
     return arguments, leftovers
 
 
@@ -149,81 +429,129 @@ if __name__ == '__main__':
     # Starts simulator in evaluate mode
     elif str(args.mode) == 'evaluate':
         simulator.show_simulation = True
-        ctrl = Controller(table_path, args.myopia, args.alpha, args.initial_temp, args.strategy)
+        ctrl = registry.create(args.c[0], table_path)
         sim = simulator.Simulation(chosen_track, bot_type, args.csv)
-        sim.evaluate(ctrl)
+        print("score", sim.evaluate(ctrl))
     # Starts simulator in learn mode and saves the best results in a file
     elif str(args.mode) == 'learn':
+        import checkpoint
         simulator.show_simulation = False
-        simulation = simulator.Simulation(chosen_track, bot_type, args.csv)
-        ctrl = Controller(table_path, args.myopia, args.alpha, args.initial_temp, args.strategy)
-        simulation.learn(ctrl, number_of_episodes)
-    elif str(args.mode) == 'comp':
-        simulator.show_simulation = True
-
-        player_1_path = 'controller1/table.txt'
-        player_2_path = 'controller2/table.txt'
-
-        player_1_score = 0
-        player_2_score = 0
-
-        for current_track in track.track.track_list:
-
-            print("Starting race in %s\n" % current_track.name)
-
-            player_1 = Controller(player_1_path, args.myopia, args.alpha, args.initial_temp, args.strategy)
-            player_2 = Controller2(player_2_path)
-
-            sim = simulator.Simulation(current_track, 'player2', args.csv)
-            sim.evaluate_comp(player_1, player_2)
-
-            print("Player 1 score: %d" % sim.car1.score)
-            print("Player 2 score: %d" % sim.car_bot.score)
-
-            if sim.car1.score > sim.car_bot.score:
-                print("Player 1 wins and received 3pts")
-                player_1_score += 3
-            elif sim.car1.score < sim.car_bot.score:
-                print("Player 2 wins and received 3pts")
-                player_2_score += 3
+        checkpoint_path = args.checkpoint or args.resume
+        time_budget = None if args.time_budget is None else budget.TimeBudget(args.time_budget[0])
+        if args.e is None and time_budget is not None:
+            number_of_episodes = None
+        if args.j is not None and args.j[0] > 1:
+            if checkpoint_path is not None or time_budget is not None:
+                raise SystemExit("Checkpoints and time budgets are only supported when learning with a single process")
+            import hogwild
+            q_table = hogwild.train(chosen_track.name, number_of_episodes, args.j[0], args.c[0], table_path, bot_type,
+                                    args.lock_stripes[0],
+                                    curriculum_name=None if args.curriculum is None else args.curriculum[0],
+                                    **learning_options(args))
+            q_table.save("./params/%s_final.txt" % datetime.datetime.fromtimestamp(time.time()).strftime('%Y%m%d%H%M%S'))
+        else:
+            interval = checkpoint.DEFAULT_INTERVAL if args.checkpoint_interval is None else args.checkpoint_interval[0]
+            saver = None if checkpoint_path is None else checkpoint.Checkpoint(checkpoint_path[0], interval)
+            if args.resume is not None:
+                resumed = checkpoint.load(args.resume[0])
+                simulation = simulator.Simulation(track.track.get_track(resumed['track_name']), resumed['bot_type'])
+                simulation.csvpath = resumed['csvpath']
+                if args.e is None:
+                    number_of_episodes = resumed['number_of_episodes']
+                if time_budget is None and resumed.get('time_left') is not None:
+                    # The run goes on for the time its budget had left
+                    time_budget = budget.TimeBudget(resumed['time_left'])
+                if number_of_episodes is None and time_budget is None:
+                    raise SystemExit("%s has no number of episodes nor time budget: resume it with -e or --time-budget"
+                                     % args.resume[0])
+                simulation.learn(resumed['controller'], number_of_episodes, resumed['curriculum'], saver, resumed,
+                                 time_budget)
             else:
-                print("Oh no, it's a tie!")
-
-            print("Player 1 points: %d" % player_1_score)
-            print("Player 2 points: %d" % player_2_score)
-
-        print("Switching sides...\n")
-
-        for current_track in track.track.track_list:
-
-            print("Starting race in %s\n" % current_track.name)
-
-            current_track.car1_position, current_track.car2_position = current_track.car2_position, current_track.car1_position
-
-            player_1 = Controller(player_1_path, args.myopia, args.alpha, args.initial_temp, args.strategy)
-            player_2 = Controller2(player_2_path)
-
-            sim = simulator.Simulation(current_track, 'player2', args.csv)
-            sim.evaluate_comp(player_1, player_2)
-
-            print("Player 1 score: %d" % sim.car1.score)
-            print("Player 2 score: %d" % sim.car_bot.score)
-
-            if sim.car1.score > sim.car_bot.score:
-                print("Player 1 wins and received 3pts")
-                player_1_score += 3
-            elif sim.car1.score < sim.car_bot.score:
-                print("Player 2 wins and received 3pts")
-                player_2_score += 3
+                simulation = simulator.Simulation(chosen_track, bot_type, args.csv)
+                ctrl = registry.create(args.c[0], table_path, **learning_options(args))
+                schedule = None
+                if args.curriculum is not None:
+                    schedule = curriculum.create(args.curriculum[0], track.track.track_list, bot_type)
+                simulation.learn(ctrl, number_of_episodes, schedule, saver, budget=time_budget)
+    elif str(args.mode) == 'prepare-tracks':
+        import trackcache
+        for a_track in (track.track.track_list if args.t is None else [chosen_track]):
+            print("%s: %s" % (a_track.name, trackcache.prepare(a_track, simulator.width, simulator.height)))
+    elif str(args.mode) == 'serve':
+        import evaluation_service
+        evaluation_service.serve(None if args.j is None else args.j[0],
+                                 port=evaluation_service.DEFAULT_PORT if args.port is None else args.port[0],
+                                 path=None if args.socket is None else args.socket[0])
+    elif str(args.mode) == 'score':
+        import evaluation_service
+        for table in args.tables:
+            print_scores(table, evaluation_service.request_scores(
+                table, port=evaluation_service.DEFAULT_PORT if args.port is None else args.port[0],
+                path=None if args.socket is None else args.socket[0], controller=args.c[0],
+                tracks=None if args.t is None else [chosen_track.name], bot=bot_type,
+                seeds=None if args.seeds is None else list(range(args.seeds[0]))))
+    elif str(args.mode) == 'report':
+        import evaluation
+        simulator.show_simulation = False
+        tables = args.tables or evaluation.saved_tables()
+        if not tables:
+            raise SystemExit("No table to evaluate")
+        reports = evaluation.evaluate(tables, args.c[0], None if args.t is None else [chosen_track.name],
+                                      None if args.seeds is None else list(range(args.seeds[0])), bot_type,
+                                      None if args.j is None else args.j[0])
+        for report in reports:
+            print_report(report)
+        print("best: %s" % reports[0].table_path)
+        if args.json is not None:
+            with open(args.json[0], 'w') as report_file:
+                json.dump([report.as_dict() for report in reports], report_file, indent=2)
+    elif str(args.mode) == 'sweep':
+        import sweep
+        simulator.show_simulation = False
+        try:
+            space = sweep.parse_space(args.space)
+            if args.eta[0] < 2:
+                raise ValueError("--eta must be at least 2")
+            if args.trials is None:
+                trials = sweep.grid(space)
             else:
-                print("Oh no, it's a tie!")
+                trials = sweep.sample(space, args.trials[0], random.Random(None if args.seed is None else args.seed[0]))
+        except ValueError as error:
+            raise SystemExit(str(error))
+        sweep.run(trials, number_of_episodes, chosen_track.name, args.c[0], bot_type,
+                  None if args.curriculum is None else args.curriculum[0], None if args.j is None else args.j[0],
+                  None if args.seed is None else args.seed[0], None if args.halving is None else args.halving[0],
+                  args.eta[0], **learning_options(args))
+    elif str(args.mode) == 'pbt':
+        import pbt
+        import sweep
+        simulator.show_simulation = False
+        try:
+            population = sweep.sample(sweep.parse_space(args.space), args.population[0],
+                                      random.Random(None if args.seed is None else args.seed[0]))
+        except ValueError as error:
+            raise SystemExit(str(error))
+        pbt.run(population, number_of_episodes, max(1, args.interval[0]), chosen_track.name, args.c[0], bot_type,
+                None if args.curriculum is None else args.curriculum[0], None if args.j is None else args.j[0],
+                None if args.seed is None else args.seed[0], **learning_options(args))
+    elif str(args.mode) == 'comp':
+        import tournament
+        if args.render:
+            simulator.show_simulation = True
+            workers = 1
+        else:
+            simulator.show_simulation = False
+            workers = None if args.j is None else args.j[0]
 
-            print("Player 1 points: %d" % player_1_score)
-            print("Player 2 points: %d" % player_2_score)
+        seeds = None if args.seeds is None else list(range(args.seeds[0]))
+        players = [player_submission(spec, i) for i, spec in enumerate(args.players)]
+        if len(players) < 2:
+            raise SystemExit("At least two players are needed for a competition")
 
-        if player_1_score > player_2_score:
-            print("Player 1 wins!")
-        elif player_1_score < player_2_score:
-            print("Player 2 wins!")
+        if len(players) > 2:
+            points, results = tournament.round_robin(players, seeds=seeds, workers=workers)
+            print_round_robin(points, results)
         else:
-            print("Oh no! It's a tie!")
+            player_1, player_2 = players
+            player_1.name, player_2.name = 'Player 1', 'Player 2'
+            print_match(tournament.run_races(tournament.race_matrix(player_1, player_2, seeds=seeds), workers))
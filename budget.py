@@ -0,0 +1,84 @@
+"""
+This module keeps learning runs within a wall-clock time budget: Simulation.learn runs episodes for as long as one more
+episode and the final saves fit in the time left, measuring how long episodes and saves take as it goes.
+
+Example:
+    To learn for at most an hour, however many episodes that is:
+
+        $ python AIRacers.py --time-budget 3600 learn
+"""
+import time
+from collections import deque
+
+# Number of recent episodes whose durations are used to estimate the next ones
+WINDOW = 20
+# Safety factor applied to the time an episode and the final saves are expected to take
+MARGIN = 1.5
+# Seconds between two progress lines
+LOG_INTERVAL = 10.0
+# Checkpoints are written at least this many times per budget...
+CHECKPOINTS_PER_BUDGET = 10
+# ... but spend at most 1 / this of the time writing checkpoints
+CHECKPOINT_OVERHEAD = 50
+
+
+class TimeBudget:
+    def __init__(self, seconds: float):
+        """
+        :param seconds: time the learning run may take, final saves included, from now on
+        """
+        self.seconds = seconds
+        self.deadline = time.monotonic() + seconds
+        self.episode_durations = deque(maxlen=WINDOW)
+        # Longest duration of each kind of final save ('table', 'checkpoint')
+        self.save_durations = {}
+
+    @property
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+    @property
+    def episode_duration(self) -> float:
+        """
+        :return: mean duration of the recent episodes, 0 before the first one
+        """
+        if not self.episode_durations:
+            return 0.0
+        return sum(self.episode_durations) / len(self.episode_durations)
+
+    def record_episode(self, seconds: float) -> None:
+        self.episode_durations.append(seconds)
+
+    def record_save(self, kind: str, seconds: float) -> None:
+        self.save_durations[kind] = max(seconds, self.save_durations.get(kind, 0.0))
+
+    def allows_episode(self) -> bool:
+        """
+        :return: True if one more episode still leaves enough time for the final saves
+        """
+        longest = max(self.episode_durations, default=0.0)
+        return self.remaining > MARGIN * (longest + sum(self.save_durations.values()))
+
+    def episodes_left(self) -> int:
+        """
+        :return: estimated number of episodes that fit in the time left
+        """
+        if not self.episode_durations:
+            return 0
+        return int(max(0.0, self.remaining) / self.episode_duration)
+
+    def log_period(self) -> int:
+        """
+        :return: number of episodes between two progress lines, about one every LOG_INTERVAL seconds
+        """
+        if not self.episode_durations:
+            return 1
+        return max(1, int(LOG_INTERVAL / max(self.episode_duration, 1e-9)))
+
+    def checkpoint_interval(self, interval: float) -> float:
+        """
+        :param interval: seconds between two checkpoints requested by the user
+        :return: seconds between two checkpoints within this budget
+        """
+        return max(min(interval, self.seconds / CHECKPOINTS_PER_BUDGET),
+                   CHECKPOINT_OVERHEAD * self.save_durations.get('checkpoint', 0.0))
@@ -0,0 +1,89 @@
+"""
+This module saves the whole state of a learning run, so that a run which was stopped (e.g. a preempted job) can go on
+exactly where it stopped, with the same exploration schedule, instead of starting over from its last table.
+
+A checkpoint holds the controller (table, exploration state, ...), the curriculum, the episode count and best scores of
+Simulation.learn, the state of the random generators and the length of the learning progress CSV file. It is written
+at the end of an episode, every few minutes and when the run is interrupted (SIGTERM or SIGINT). Checkpoints are
+written to a temporary file which then replaces the previous checkpoint, so a crash while writing never loses it.
+
+Example:
+    To learn with a checkpoint, and then go on after the job was stopped:
+
+        $ python AIRacers.py -e 10000 --checkpoint params/run.ckpt learn
+        $ python AIRacers.py --resume params/run.ckpt learn
+"""
+import os
+import pickle
+import signal
+import tempfile
+import time
+from contextlib import contextmanager
+
+# Seconds between two checkpoints, by default
+DEFAULT_INTERVAL = 300.0
+
+
+def load(path: str) -> dict:
+    """
+    :return: the training state saved in a checkpoint file
+    """
+    with open(path, 'rb') as checkpoint_file:
+        return pickle.load(checkpoint_file)
+
+
+class Checkpoint:
+    def __init__(self, path: str, interval: float = DEFAULT_INTERVAL):
+        """
+        Writes the training state of a learning run to a file.
+
+        :param path: checkpoint file, replaced by every new checkpoint
+        :param interval: seconds between two checkpoints
+        """
+        self.path = path
+        self.interval = interval
+        self.last_write = time.monotonic()
+        # Set when the run was asked to stop, it should then write a last checkpoint and return
+        self.stop_requested = False
+
+    def due(self) -> bool:
+        """
+        :return: True if a checkpoint should be written now
+        """
+        return self.stop_requested or time.monotonic() - self.last_write >= self.interval
+
+    def write(self, state: dict) -> None:
+        """
+        Atomically replaces the checkpoint file with the given training state.
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix='.checkpoint')
+        try:
+            with os.fdopen(descriptor, 'wb') as checkpoint_file:
+                pickle.dump(state, checkpoint_file, protocol=pickle.HIGHEST_PROTOCOL)
+                checkpoint_file.flush()
+                os.fsync(checkpoint_file.fileno())
+            os.replace(temporary_path, self.path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+        self.last_write = time.monotonic()
+
+    @contextmanager
+    def catching_signals(self):
+        """
+        Context in which SIGTERM and SIGINT only set stop_requested, leaving the run a chance to save its state. A
+        second signal interrupts the run right away.
+        """
+        def request_stop(signal_number, frame):
+            if self.stop_requested:
+                signal.default_int_handler(signal_number, frame)
+            self.stop_requested = True
+
+        previous = {signal_number: signal.signal(signal_number, request_stop)
+                    for signal_number in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            yield self
+        finally:
+            for signal_number, handler in previous.items():
+                signal.signal(signal_number, handler)
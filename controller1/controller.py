@@ -1,15 +1,34 @@
 from random import randint, uniform
 from math import exp
+import numpy as np
 import interfaces as controller_template
 from controller1.sensors import *
 from controller1.state import State
 from controller1.qtable import QTable
+from controller1.traces import EligibilityTraces
+from controller1.convergence import ConvergenceMonitor
 
 NUM_OF_ACTIONS = 5
 MAX_POSSIBLE_DIFF = 20  # maximum speed going straigth towards the checkpoint
 
 class Controller(controller_template.Controller):
-    def __init__(self, q_table_path: str, atten: float, alpha: float, init_temp: float, strategy: str):
+    state_type = State
+
+    def __init__(self, q_table_path: str, atten: float = 0.9, alpha: float = 0.5, init_temp: float = 90.0,
+                 strategy: str = 'boltzmann', trace_decay: float = 0.0, alpha_visits: int = 0,
+                 trace_capacity: int = 256, convergence: ConvergenceMonitor = None):
+        """
+        :param q_table_path: table to start from, None for a new one
+        :param atten: attenuation of future rewards (gamma)
+        :param alpha: learning rate
+        :param init_temp: initial temperature of the boltzmann exploration
+        :param strategy: exploration strategy, 'boltzmann' or 'epsilon'
+        :param trace_decay: lambda of Watkins's Q(lambda); 0 for one-step Q-learning
+        :param alpha_visits: if not 0, the learning rate of a state is alpha * alpha_visits / (alpha_visits + visits),
+                             so it is halved once the state has been updated alpha_visits times
+        :param trace_capacity: maximum number of eligibility traces kept at once
+        :param convergence: monitor stopping learning once the table stops changing, None to learn for every episode
+        """
         if q_table_path is None:
             self.q_table = QTable()
         else:
@@ -27,6 +46,13 @@ class Controller(controller_template.Controller):
         self.atten = atten
         # Learning rate frame-wise
         self.alpha = alpha
+        self.alpha_visits = alpha_visits
+
+        # Q(lambda)
+        self.trace_decay = trace_decay
+        self.traces = EligibilityTraces(trace_capacity)
+
+        self.convergence = convergence
         
         # Exploration
         self.strategy = strategy
@@ -37,6 +63,54 @@ class Controller(controller_template.Controller):
         self.eps = 0.1
         self.eps_factor = 0.99
 
+        # States built by act() on the previous frame, one per car
+        self.acting_states = []
+
+    def make_state(self, sensors: list, previous: State = None) -> State:
+        return State(sensors, previous)
+
+    def act(self, sensors_batch: list) -> list:
+        """
+        Greedy action of each car, looked up with a single indexing of the policy (after freeze()) or of the Q-table
+        :param sensors_batch: A list with the sensor readings of each car
+        :return: A list with the action chosen for each car
+        """
+        previous = self.acting_states
+        if len(previous) != len(sensors_batch):
+            previous = [None] * len(sensors_batch)
+
+        self.acting_states = [State(sensors, state) for sensors, state in zip(sensors_batch, previous)]
+        state_ids = [state.state_id for state in self.acting_states]
+
+        if self.policy is not None:
+            return self.policy.actions[state_ids].tolist()
+        return (self.q_table.q_table[state_ids].argmax(axis=1) + 1).tolist()
+
+    def freeze(self) -> None:
+        self.policy = controller_template.GreedyPolicy.from_q_values(self.q_table.q_table)
+
+    def start_episode(self) -> None:
+        self.policy = None
+        self.traces.clear()
+        if self.convergence is not None:
+            self.convergence.start_episode(self.q_table.q_table, self.q_table.visits)
+
+    def end_episode(self) -> None:
+        if self.convergence is not None:
+            self.convergence.end_episode(self.q_table.q_table, self.q_table.visits)
+
+    def converged(self) -> bool:
+        return self.convergence is not None and self.convergence.converged
+
+    def learning_rate(self, visits):
+        """
+        :param visits: number of visits of a state, or an array of them
+        :return: the learning rate of states visited that many times
+        """
+        if self.alpha_visits == 0:
+            return self.alpha
+        return self.alpha * self.alpha_visits / (self.alpha_visits + visits)
+
     def update_q(self, new_state: State, old_state: State, action: int, reward: float, end_of_race: bool) -> None:
         """
 
@@ -47,13 +121,44 @@ class Controller(controller_template.Controller):
         :param end_of_race: boolean indicating if a race timeout was reached
         """
 
-        pref = self.q_table.get_q_value(old_state, action)
-        next_action, next_pref = self.q_table.get_best_action(new_state)
-        # Q-Learning equation:
-        # Alpha rate of learning, gamma time attenuation of future benefit
-        updated = (1-self.alpha)*pref + self.alpha*(reward + self.atten * next_pref)
-
-        self.q_table.set_q_value(old_state, action, updated)
+        if self.trace_decay == 0:
+            lock = self.q_table.locked(old_state)
+        else:
+            # Q(lambda) updates every state with an active trace along with old_state
+            indices, _ = self.traces.active()
+            lock = self.q_table.locked_states(np.append(indices // NUM_OF_ACTIONS, old_state.state_id))
+
+        with lock:
+            visits = self.q_table.count_visit(old_state)
+            pref = self.q_table.get_q_value(old_state, action)
+            next_action, next_pref = self.q_table.get_best_action(new_state)
+
+            if self.trace_decay == 0:
+                # Q-Learning equation:
+                # Alpha rate of learning, gamma time attenuation of future benefit
+                alpha = self.learning_rate(visits)
+                updated = (1-alpha)*pref + alpha*(reward + self.atten * next_pref)
+
+                self.q_table.set_q_value(old_state, action, updated)
+                if self.convergence is not None:
+                    self.convergence.add(abs(updated - pref))
+                return
+
+            # Watkins's Q(lambda): the error is credited to every recently visited pair, along the greedy path only
+            greedy_action, _ = self.q_table.get_best_action(old_state)
+            if action != greedy_action:
+                self.traces.clear()
+            self.traces.mark(old_state.state_id * NUM_OF_ACTIONS + action - 1)
+
+            error = reward + self.atten * next_pref - pref
+            indices, traces = self.traces.active()
+            q_values = self.q_table.q_table.reshape(-1)
+            deltas = self.learning_rate(self.q_table.visits[indices // NUM_OF_ACTIONS]) * error * traces
+            q_values[indices] += deltas
+            if self.convergence is not None:
+                self.convergence.add_many(abs(deltas))
+
+            self.traces.decay(self.atten * self.trace_decay)
 
 
     def compute_reward(self, new_state: State, old_state: State, action: int, n_steps: int,
@@ -0,0 +1,85 @@
+import numpy as np
+
+# Default thresholds, see ConvergenceMonitor
+MAX_DELTA = 1.0
+MEAN_DELTA = 0.05
+GREEDY_CHANGES = 0.001
+
+
+class ConvergenceMonitor:
+    def __init__(self, patience: int, max_delta: float = MAX_DELTA, mean_delta: float = MEAN_DELTA,
+                 greedy_changes: float = GREEDY_CHANGES):
+        """
+        Tells when a Q-table has stopped changing. Every episode, it accumulates the largest and mean absolute change of
+        the Q-value updates, and compares the greedy action of every state visited during the episode before and after
+        it.
+
+        :param patience: number of consecutive episodes which must stay below every threshold
+        :param max_delta: threshold of the largest absolute change of a Q-value in an episode
+        :param mean_delta: threshold of the mean absolute change of the Q-values updated in an episode
+        :param greedy_changes: threshold of the fraction of the states visited in an episode whose greedy action
+                               changed
+        """
+        self.patience = patience
+        self.max_delta = max_delta
+        self.mean_delta = mean_delta
+        self.greedy_changes = greedy_changes
+
+        self.greedy_actions = None
+        self.start_visits = None
+        self.episode_max = 0.0
+        self.episode_sum = 0.0
+        self.episode_updates = 0
+        # Statistics of the last episode: (largest change, mean change, fraction of greedy actions changed)
+        self.last = None
+        # Number of consecutive episodes below every threshold
+        self.calm_episodes = 0
+
+    def start_episode(self, q_values: np.ndarray, visits: np.ndarray) -> None:
+        """
+        :param q_values: dense array of Q-values, one row per state
+        :param visits: number of visits of each state
+        """
+        self.greedy_actions = q_values.argmax(axis=1)
+        self.start_visits = visits.copy()
+        self.episode_max = 0.0
+        self.episode_sum = 0.0
+        self.episode_updates = 0
+
+    def add(self, delta: float) -> None:
+        """
+        Records the absolute change of a Q-value
+        """
+        if delta > self.episode_max:
+            self.episode_max = delta
+        self.episode_sum += delta
+        self.episode_updates += 1
+
+    def add_many(self, deltas: np.ndarray) -> None:
+        """
+        Records the absolute changes of several Q-values
+        """
+        if len(deltas):
+            self.episode_max = max(self.episode_max, float(deltas.max()))
+            self.episode_sum += float(deltas.sum())
+            self.episode_updates += len(deltas)
+
+    def end_episode(self, q_values: np.ndarray, visits: np.ndarray) -> None:
+        """
+        :param q_values: dense array of Q-values, one row per state
+        :param visits: number of visits of each state
+        """
+        # Only the states visited during this episode could change
+        visited = visits > self.start_visits
+        changed = (q_values.argmax(axis=1) != self.greedy_actions) & visited
+        mean = self.episode_sum / self.episode_updates if self.episode_updates else 0.0
+        self.last = (float(self.episode_max), float(mean), float(changed.sum() / max(1, visited.sum())))
+
+        if self.last[0] <= self.max_delta and self.last[1] <= self.mean_delta and self.last[2] <= self.greedy_changes:
+            self.calm_episodes += 1
+        else:
+            self.calm_episodes = 0
+
+    @property
+    def converged(self) -> bool:
+        return self.calm_episodes >= self.patience
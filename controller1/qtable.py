@@ -1,41 +1,58 @@
 import interfaces as controller_template
 from controller1.state import State
+from contextlib import ExitStack, contextmanager, nullcontext
+from multiprocessing import resource_tracker, shared_memory
+import multiprocessing
+import numpy as np
 import pickle
 
+NUM_OF_ACTIONS = 5
+
+_no_lock = nullcontext()
+
+
+@contextmanager
+def _holding(locks: list):
+    with ExitStack() as stack:
+        for lock in locks:
+            stack.enter_context(lock)
+        yield
+
 
 class QTable(controller_template.QTable):
     def __init__(self):
         """
-        This class is used to create/load/store your Q-table. To store values we strongly recommend the use of a Python
-        dictionary.
-        """
-
-        # The key to the dictionary is the state, the value is another dictonary
-        # The key of that dictionary is an action and the value is the Q value
-        # of that action in that state
-        # {
-        #   <State> {
-        #               1: q val
-        #               2: q val
-        #               3: q val
-        #               4: q val
-        #               5: q val
-        #           }
-        #   <Another state> { ... }
+        This class is used to create/load/store your Q-table. Values are kept in a dense array indexed by the state id
+        (see State.get_state_id) and by the action.
+        """
+
+        # One row per state, one column per action
+        #                 1       2       3       4       5
+        #   state 0   [ q val,  q val,  q val,  q val,  q val ]
+        #   state 1   [  ...                                  ]
         #   ....
-        # }
+        # Actions are numbered from 1, so action a lives in column a - 1
 
         self.default_pref = 0.1
-        self.q_table = {}
-
-        states = State.enumerate_all_possible_states()
-        actions = range(1, 6)  # because the interval is [1, 6)
+        self.q_table = np.zeros((State.get_number_of_states(), NUM_OF_ACTIONS))
+        # Number of Q-learning updates of each state
+        self.visits = np.zeros(State.get_number_of_states(), dtype=np.int64)
 
-        for state in states:
-            state_actions = {}
-            for action in actions:
-                state_actions[action] = 0  # randint(0,50)
-            self.q_table[state] = state_actions
+    def __setstate__(self, state: dict):
+        """
+        Tables pickled before the switch to dense arrays map each discretized tuple to a dictionary of actions, so
+        they are converted on load. Tables pickled before visits were counted start from zero visits.
+        """
+        q_table = state['q_table']
+        if isinstance(q_table, dict):
+            dense = np.zeros((State.get_number_of_states(), NUM_OF_ACTIONS))
+            for key, actions in q_table.items():
+                for action, q_value in actions.items():
+                    dense[State.get_state_id(key), action - 1] = q_value
+            state['q_table'] = dense
+        if 'visits' not in state:
+            state['visits'] = np.zeros(State.get_number_of_states(), dtype=np.int64)
+        self.__dict__.update(state)
 
     def get_q_value(self, key: State, action: int) -> float:
         """
@@ -44,9 +61,14 @@ class QTable(controller_template.QTable):
         :param action: an action
         :return: The Q-value associated with the given state/action pair
         """
-        key = key.discretized_state
-        q_value = self.q_table[key][action]
-        return q_value
+        return self.q_table[key.state_id, action - 1]
+
+    def get_q_values(self, key: State) -> np.ndarray:
+        """
+        :param key: a State object
+        :return: The Q-values of every action (action a at position a - 1) in the given state
+        """
+        return self.q_table[key.state_id]
 
     def set_q_value(self, key: State, action: int, new_q_value: float) -> None:
         """
@@ -56,17 +78,40 @@ class QTable(controller_template.QTable):
         :param new_q_value: the new Q-value to associate with the specified state/action pair
         :return:
         """
-        key = key.discretized_state
-        self.q_table[key][action] = new_q_value
+        self.q_table[key.state_id, action - 1] = new_q_value
 
-    def get_best_action(self, key: State) -> (int, int):
+    def count_visit(self, key: State) -> int:
+        """
+        :param key: a State object
+        :return: the number of visits of the given state, this one included
+        """
+        self.visits[key.state_id] += 1
+        return self.visits[key.state_id]
 
-        key = key.discretized_state
-        values = self.q_table[key]
-        best_action = max(values)
-        best_q_value = self.q_table[key][best_action]
+    def locked(self, key: State):
+        """
+        :param key: a State object
+        :return: a context manager held while the Q-values of the given state are read and updated. Plain tables are
+                 only used by a single process and do not lock anything.
+        """
+        return _no_lock
 
-        return best_action, best_q_value
+    def locked_states(self, state_ids: np.ndarray):
+        """
+        :param state_ids: ids of the states whose Q-values are read and updated together
+        :return: a context manager held during the update (see locked)
+        """
+        return _no_lock
+
+    def get_best_action(self, key: State) -> (int, float):
+        """
+        :param key: a State object
+        :return: The action with the highest Q-value in the given state (lowest action on ties) and that Q-value
+        """
+        values = self.q_table[key.state_id]
+        best_action = int(values.argmax())
+
+        return best_action + 1, values[best_action]
 
     @staticmethod
     def load(path: str) -> "QTable":
@@ -88,3 +133,82 @@ class QTable(controller_template.QTable):
         """
         with open(path, 'wb') as handle:
             pickle.dump(self, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class SharedQTable(QTable):
+    def __init__(self, q_values: np.ndarray = None, lock_stripes: int = 0):
+        """
+        A QTable whose values live in shared memory, so that several processes update the very same table. Pickling
+        it only transfers the name of the shared memory block (and the locks), so it can be given to worker processes
+        as an argument; the creator is responsible for calling close() and unlink() once every worker is done.
+
+        :param q_values: initial values, zeros by default
+        :param lock_stripes: 0 for lock-free (Hogwild) updates; otherwise the number of locks shared among the states,
+                             which makes each update of a state atomic
+
+        Visit counts are not shared: each process counts the visits of its own learner.
+        """
+        self.default_pref = 0.1
+        self.visits = np.zeros(State.get_number_of_states(), dtype=np.int64)
+        shape = (State.get_number_of_states(), NUM_OF_ACTIONS)
+
+        self.memory = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * np.dtype(np.float64).itemsize)
+        self.q_table = np.ndarray(shape, dtype=np.float64, buffer=self.memory.buf)
+        self.q_table[:] = 0 if q_values is None else q_values
+
+        self.locks = [multiprocessing.Lock() for _ in range(lock_stripes)]
+
+    def __getstate__(self) -> dict:
+        return {'default_pref': self.default_pref, 'name': self.memory.name, 'shape': self.q_table.shape,
+                'locks': self.locks}
+
+    def __setstate__(self, state: dict):
+        self.default_pref = state['default_pref']
+        self.visits = np.zeros(State.get_number_of_states(), dtype=np.int64)
+        self.locks = state['locks']
+        self.memory = shared_memory.SharedMemory(name=state['name'])
+        # Only the creator owns the block; attaching must not schedule it for removal when this process exits
+        try:
+            resource_tracker.unregister(self.memory._name, 'shared_memory')
+        except (AttributeError, KeyError):
+            pass
+        self.q_table = np.ndarray(state['shape'], dtype=np.float64, buffer=self.memory.buf)
+
+    def locked(self, key: State):
+        if not self.locks:
+            return _no_lock
+        return self.locks[key.state_id % len(self.locks)]
+
+    def locked_states(self, state_ids: np.ndarray):
+        if not self.locks:
+            return _no_lock
+        # Stripes are always acquired in increasing order, so that concurrent updates cannot deadlock
+        stripes = np.unique(np.asarray(state_ids) % len(self.locks))
+        return _holding([self.locks[stripe] for stripe in stripes])
+
+    def to_qtable(self) -> QTable:
+        """
+        :return: a regular QTable holding a copy of the current values
+        """
+        q_table = QTable()
+        q_table.q_table[:] = self.q_table
+        return q_table
+
+    def save(self, path: str, *args) -> None:
+        """
+        Saves a copy of the table as a regular QTable
+        """
+        self.to_qtable().save(path, *args)
+
+    def close(self) -> None:
+        """
+        Detaches this process from the shared memory block
+        """
+        self.q_table = None
+        self.memory.close()
+
+    def unlink(self) -> None:
+        """
+        Frees the shared memory block; every process must have closed it
+        """
+        self.memory.unlink()
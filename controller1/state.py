@@ -5,13 +5,49 @@ from controller1.sensors import *
 
 
 class State(controller_template.State):
-    def __init__(self, sensors: list):
+    __slots__ = ('previous', '_features', '_discretized_state', '_state_id')
+
+    def __init__(self, sensors: list, previous: 'State' = None):
+        """
+        Features are only computed (and then cached) the first time they are requested.
+        :param sensors: sensor readings of the car
+        :param previous: the state the car was in on the previous frame, if any. It is released as soon as the features
+                         are cached, so a chain of states never holds more than one step of history.
+        """
         self.sensors = sensors
+        self.previous = previous
 
-        self.prev_sens = [0.0 for x in self.sensors]
-        self.prev_feats = []
+        self._features = None
+        self._discretized_state = None
+        self._state_id = None
+
+    @property
+    def features(self) -> Tuple:
+        """
+        :return: the (cached) output of compute_features
+        """
+        if self._features is None:
+            self._features = self.compute_features()
+            self.previous = None
+        return self._features
 
-        self.discretized_state = self.discretize_features(self.compute_features())
+    @property
+    def discretized_state(self) -> Tuple:
+        """
+        :return: the (cached) output of discretize_features
+        """
+        if self._discretized_state is None:
+            self._discretized_state = self.discretize_features(self.features)
+        return self._discretized_state
+
+    @property
+    def state_id(self) -> int:
+        """
+        :return: the (cached) dense identifier of the discretized state
+        """
+        if self._state_id is None:
+            self._state_id = self.get_state_id(self.discretized_state)
+        return self._state_id
 
     def compute_features(self) -> Tuple:
         """
@@ -40,10 +76,10 @@ class State(controller_template.State):
 
         
         # Some features
-        if (self.sensors[CHECKPOINT] == 1) or (self.prev_sens[DIST_CHECKPOINT] == 0):
+        if (self.sensors[CHECKPOINT] == 1) or (self.previous is None):
             check_diff = 20
         else:
-            check_diff = self.prev_sens[DIST_CHECKPOINT] - self.sensors[DIST_CHECKPOINT]
+            check_diff = self.previous.sensors[DIST_CHECKPOINT] - self.sensors[DIST_CHECKPOINT]
 
         return [check_diff]
 
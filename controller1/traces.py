@@ -0,0 +1,62 @@
+import numpy as np
+
+
+class EligibilityTraces:
+    def __init__(self, capacity: int = 256, cutoff: float = 0.01):
+        """
+        Sparse eligibility traces of the state/action pairs visited recently. Only the active traces are stored, in
+        fixed size arrays, so that updating them costs O(active traces) whatever the size of the Q-table.
+
+        Pairs are identified by their flat index in the Q-table array (state_id * NUM_OF_ACTIONS + action - 1).
+
+        :param capacity: maximum number of active traces; once full, the weakest trace is dropped to make room
+        :param cutoff: traces decayed below this value are dropped
+        """
+        self.capacity = capacity
+        self.cutoff = cutoff
+        self.indices = np.zeros(capacity, dtype=np.int64)
+        self.values = np.zeros(capacity)
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def clear(self) -> None:
+        self.size = 0
+
+    def mark(self, index: int) -> None:
+        """
+        Sets the trace of a pair to 1 (replacing traces)
+        :param index: flat index of the pair
+        """
+        found = np.flatnonzero(self.indices[:self.size] == index)
+        if len(found):
+            slot = found[0]
+        elif self.size < self.capacity:
+            slot = self.size
+            self.size += 1
+        else:
+            slot = self.values[:self.size].argmin()
+
+        self.indices[slot] = index
+        self.values[slot] = 1.0
+
+    def active(self) -> (np.ndarray, np.ndarray):
+        """
+        :return: the flat indices of the active pairs and their traces (views, valid until the traces change)
+        """
+        return self.indices[:self.size], self.values[:self.size]
+
+    def decay(self, factor: float) -> None:
+        """
+        Multiplies every trace by factor, dropping the ones that fall below the cutoff
+        """
+        values = self.values[:self.size]
+        values *= factor
+
+        keep = values >= self.cutoff
+        if not keep.all():
+            size = int(keep.sum())
+            self.indices[:size] = self.indices[:self.size][keep]
+            self.values[:size] = values[keep]
+            self.size = size
@@ -229,6 +229,8 @@ class QTable(controller_template.QTable):
 
 
 class Controller(controller_template.Controller):
+    state_type = State
+
     def __init__(self, q_table_path: str):
         if q_table_path is None:
             self.q_table = QTable()
@@ -0,0 +1,144 @@
+"""
+This module implements curricula: schedules picking the track of each learning episode, so that a single table learns to
+race on several tracks in one run (see simulator.Simulation.learn).
+
+A curriculum keeps one Simulation per track it has used, so switching tracks between episodes costs nothing after the
+first race on each track.
+
+    round_robin     every track in turn
+    weighted        random tracks, favouring the ones with the lowest recent scores (relative to each other)
+    staged          starts on the easiest track and adds the next one every number_of_episodes / len(tracks) episodes,
+                    racing on random tracks among the ones added so far
+
+Example:
+    To learn on every track, easiest first:
+
+        $ python AIRacers.py -e 1000 --curriculum staged learn
+"""
+import random
+from collections import deque
+
+import simulator
+
+# Track names from the easiest to the hardest, staged curricula add tracks in this order (unlisted tracks come last)
+DIFFICULTY_ORDER = ('baby_park', 'track1', 'track2', 'track3', 'interlagos')
+
+
+class Curriculum:
+    def __init__(self, tracks: list, bot_type: str = None):
+        """
+        Base class of curricula, which only have to implement choose_track.
+
+        :param tracks: Track objects to learn on
+        :param bot_type: Type of bot racing alongside the car, can be set to None for no bot
+        """
+        if not tracks:
+            raise ValueError("A curriculum needs at least one track")
+        self.tracks = list(tracks)
+        self.bot_type = bot_type
+        self.simulations = {}
+
+    def use(self, simulation: simulator.Simulation) -> None:
+        """
+        Makes the curriculum race on an existing simulation of its track rather than creating a new one.
+        """
+        self.simulations.setdefault(simulation.track.name, simulation)
+
+    def __getstate__(self) -> dict:
+        # Simulations can't be pickled: a curriculum sent to another process starts over with new ones (see use)
+        state = dict(self.__dict__)
+        state['simulations'] = {}
+        return state
+
+    def simulation(self, track) -> simulator.Simulation:
+        """
+        :return: the simulation of a track, created on first use
+        """
+        if track.name not in self.simulations:
+            self.simulations[track.name] = simulator.Simulation(track, self.bot_type)
+        return self.simulations[track.name]
+
+    def choose_track(self, episode: int, number_of_episodes: int):
+        """
+        :param episode: number of the episode about to be run
+        :param number_of_episodes: total number of episodes of the run
+        :return: the Track to run the episode on
+        """
+        raise NotImplementedError()
+
+    def record(self, track, score: float) -> None:
+        """
+        Called with the score of each episode, once it is over.
+        """
+        pass
+
+
+class RoundRobin(Curriculum):
+    def choose_track(self, episode: int, number_of_episodes: int):
+        return self.tracks[episode % len(self.tracks)]
+
+
+class Weighted(Curriculum):
+    def __init__(self, tracks: list, bot_type: str = None, window: int = 10):
+        """
+        Picks tracks at random, with probabilities proportional to their rank when sorted from the best recent score to
+        the worst, so that the table spends more time where it races worse. Ranks are used because scores of different
+        tracks have different scales. Tracks without any score yet are picked first.
+
+        :param window: number of recent scores of each track taken into account
+        """
+        super().__init__(tracks, bot_type)
+        self.scores = {a_track.name: deque(maxlen=window) for a_track in self.tracks}
+
+    def choose_track(self, episode: int, number_of_episodes: int):
+        for a_track in self.tracks:
+            if not self.scores[a_track.name]:
+                return a_track
+
+        # From the best recent score to the worst
+        ranked = sorted(self.tracks, key=lambda a_track: -self.recent_score(a_track))
+        return random.choices(ranked, weights=range(1, len(ranked) + 1))[0]
+
+    def recent_score(self, track) -> float:
+        scores = self.scores[track.name]
+        return sum(scores) / len(scores)
+
+    def record(self, track, score: float) -> None:
+        self.scores[track.name].append(score)
+
+
+class Staged(Curriculum):
+    def __init__(self, tracks: list, bot_type: str = None):
+        """
+        Adds tracks from the easiest to the hardest (see DIFFICULTY_ORDER), keeping the previous ones in the mix so the
+        table doesn't forget them.
+        """
+        def difficulty(a_track):
+            if a_track.name in DIFFICULTY_ORDER:
+                return DIFFICULTY_ORDER.index(a_track.name)
+            return len(DIFFICULTY_ORDER)
+
+        super().__init__(sorted(tracks, key=difficulty), bot_type)
+
+    def choose_track(self, episode: int, number_of_episodes: int):
+        stage_length = max(1, number_of_episodes // len(self.tracks))
+        stage = min(episode // stage_length, len(self.tracks) - 1)
+        return random.choice(self.tracks[:stage + 1])
+
+
+CURRICULA = {
+    'round_robin': RoundRobin,
+    'weighted': Weighted,
+    'staged': Staged,
+}
+
+
+def create(name: str, tracks: list, bot_type: str = None) -> Curriculum:
+    """
+    :param name: one of CURRICULA
+    :param tracks: Track objects to learn on
+    :param bot_type: Type of bot racing alongside the car, can be set to None for no bot
+    """
+    if name not in CURRICULA:
+        raise ValueError("Unknown curriculum: %s (available: %s)" % (name, ', '.join(CURRICULA)))
+    return CURRICULA[name](tracks, bot_type)
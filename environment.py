@@ -0,0 +1,129 @@
+"""
+This module wraps simulator.Simulation in a gym-style environment, so external training loops can drive the player's car
+without going through Simulation.learn.
+
+Example:
+    simulator.show_simulation = False
+    env = RacerEnv(tracks_config.baby_park)
+    observation = env.reset(seed=0)
+    done = False
+    while not done:
+        observation, reward, done, info = env.step(my_policy(observation))
+
+Observations are the 14 sensor readings of the player's car (see interfaces.State.compute_features) as a float32
+array. Environments write them into preallocated arrays, so an observation is only valid until the environment is
+stepped twice more: copy it if it must be kept.
+"""
+import random
+
+import numpy as np
+
+import simulator
+
+NUM_SENSORS = simulator.NUM_SENSORS
+NUM_ACTIONS = len(simulator._Car.ACTION_LIST)
+
+
+class RacerEnv:
+    def __init__(self, track, bot_type: str = None, reward_function=None):
+        """
+        :param track: Track object witch configures the scenario
+        :param bot_type: Type of bot to be alongside the player, None for no bot
+        :param reward_function: optional callable(previous_observation, observation, action) -> float. By default the
+                                reward is how much the car's score (see simulator._Car.score) changed in the step.
+        """
+        self.simulation = simulator.Simulation(track, bot_type)
+        self.actions = simulator._Car.ACTION_LIST
+        self.episode_length = track.episode_length
+        self.reward_function = reward_function
+
+        # Two buffers, so the previous observation is still around when computing rewards
+        self._observations = np.zeros((2, NUM_SENSORS), dtype=np.float32)
+        self._current = 0
+
+        self.frame_number = 0
+        self.score = 0.0
+
+    def _observe(self, sensors: list) -> np.ndarray:
+        self._current ^= 1
+        observation = self._observations[self._current]
+        observation[:] = sensors
+        return observation
+
+    def reset(self, seed: int = None) -> np.ndarray:
+        """
+        Starts a new race.
+
+        :param seed: seeds the bomb layout (and every other random choice of the simulator)
+        :return: the first observation
+        """
+        if seed is not None:
+            random.seed(seed)
+            np.random.seed(seed)
+
+        self.simulation.reset()
+        self.frame_number = 0
+        observation = self._observe(self.simulation.frame_step(5))
+        self.score = self.simulation.car1.score
+        return observation
+
+    def step(self, action: int) -> (np.ndarray, float, bool, dict):
+        """
+        Advances the race by one frame.
+
+        :param action: action of the player's car, one of self.actions
+        :return: a tuple containing the new observation, the reward, whether the race is over and a dictionary with the
+                 car's score, current checkpoint and frame number
+        """
+        previous_observation = self._observations[self._current]
+        observation = self._observe(self.simulation.frame_step(action))
+        self.frame_number += 1
+
+        score = self.simulation.car1.score
+        if self.reward_function is None:
+            reward = score - self.score
+        else:
+            reward = self.reward_function(previous_observation, observation, action)
+        self.score = score
+
+        done = self.frame_number > self.episode_length
+        info = {'score': score, 'checkpoint': self.simulation.car1.current_checkpoint, 'frame': self.frame_number}
+
+        return observation, reward, done, info
+
+
+class VectorRacerEnv:
+    def __init__(self, envs: list):
+        """
+        Steps several environments in lockstep, restarting each one as soon as its race is over.
+
+        :param envs: list of RacerEnv
+        """
+        self.envs = envs
+        self.observations = np.zeros((len(envs), NUM_SENSORS), dtype=np.float32)
+        self.rewards = np.zeros(len(envs), dtype=np.float32)
+        self.dones = np.zeros(len(envs), dtype=bool)
+
+    def reset(self, seed: int = None) -> np.ndarray:
+        """
+        :param seed: environment i is reset with seed + i
+        :return: an array with one observation per environment
+        """
+        for i, env in enumerate(self.envs):
+            self.observations[i] = env.reset(None if seed is None else seed + i)
+        return self.observations
+
+    def step(self, actions: list) -> (np.ndarray, np.ndarray, np.ndarray, list):
+        """
+        :param actions: one action per environment
+        :return: arrays with the observation, reward and done flag of each environment, plus the list of infos. The
+                 observation of a finished environment is already the first one of its next race.
+        """
+        infos = []
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            observation, self.rewards[i], self.dones[i], info = env.step(action)
+            if self.dones[i]:
+                observation = env.reset()
+            self.observations[i] = observation
+            infos.append(info)
+        return self.observations, self.rewards, self.dones, infos
@@ -0,0 +1,166 @@
+"""
+This module evaluates tables in batch: every table races alone on every track, once per bomb layout, in a pool of
+headless worker processes, and the results are summed up in a report per table.
+
+Each race stops after the episode_length of its track and reports the score of the car, the number of checkpoints it
+crossed and the number of frames it spent on the grass. Reports give the mean, standard deviation, minimum and maximum of
+those over the seeds of each track, and over every race of the table.
+
+Example:
+    To rank every table of params/ on 10 bomb layouts of each track:
+
+        $ python AIRacers.py --seeds 10 report
+"""
+import glob
+import multiprocessing
+import random
+import statistics
+
+import numpy as np
+
+import registry
+import simulator
+import tracks_config as track
+
+# Seeds used when none are given: a single layout gives no idea of the spread of the scores
+DEFAULT_SEEDS = 5
+
+# Simulations of a worker process, by (track name, bot type)
+_simulations = {}
+
+
+def simulation(track_name: str, bot_type: str) -> simulator.Simulation:
+    """
+    :return: the simulation of a track in the current process, created on first use
+    """
+    key = (track_name, bot_type)
+    if key not in _simulations:
+        _simulations[key] = simulator.Simulation(track.track.get_track(track_name), bot_type)
+    return _simulations[key]
+
+
+class RaceStatistics:
+    def __init__(self, table_path: str, track_name: str, seed: int, score: float, checkpoints: int,
+                 grass_frames: int):
+        """
+        Outcome of a single evaluation race.
+
+        :param seed: seed used for the bomb layout, None if it was left random
+        :param checkpoints: number of checkpoints the car crossed
+        :param grass_frames: number of frames the car spent off the track
+        """
+        self.table_path = table_path
+        self.track_name = track_name
+        self.seed = seed
+        self.score = score
+        self.checkpoints = checkpoints
+        self.grass_frames = grass_frames
+
+
+def run_evaluation(job: tuple) -> RaceStatistics:
+    """
+    Races a table on a track in the current process, reusing the simulations of previous jobs.
+
+    :param job: (controller name, table path, track name, bot type, seed)
+    """
+    controller_name, table_path, track_name, bot_type, seed = job
+    race = simulation(track_name, bot_type)
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+    score = race.evaluate(registry.create(controller_name, table_path))
+    return RaceStatistics(table_path, track_name, seed, score, race.car1.checkpoints_reached, race.car1.grass_penalty)
+
+
+def summary(values: list) -> dict:
+    """
+    :return: mean, standard deviation, minimum and maximum of values
+    """
+    return {'mean': statistics.mean(values), 'stdev': statistics.stdev(values) if len(values) > 1 else 0.0,
+            'min': min(values), 'max': max(values)}
+
+
+class Report:
+    def __init__(self, table_path: str, races: list):
+        """
+        Statistics of the evaluation races of a table.
+
+        :param races: RaceStatistics of the table, on any number of tracks
+        """
+        self.table_path = table_path
+        self.races = races
+
+    @property
+    def track_names(self) -> list:
+        """
+        :return: names of the tracks raced, in the order of their first race
+        """
+        return list(dict.fromkeys(race.track_name for race in self.races))
+
+    def statistics(self, track_name: str = None) -> dict:
+        """
+        :param track_name: track to sum up, every race of the table if None
+        :return: summaries (see summary) of the scores, checkpoints and grass frames, and the number of races
+        """
+        races = [race for race in self.races if track_name is None or race.track_name == track_name]
+        return {'races': len(races),
+                'score': summary([race.score for race in races]),
+                'checkpoints': summary([race.checkpoints for race in races]),
+                'grass_frames': summary([race.grass_frames for race in races])}
+
+    @property
+    def mean_score(self) -> float:
+        return statistics.mean(race.score for race in self.races)
+
+    def as_dict(self) -> dict:
+        """
+        :return: the report as plain data, ready to be dumped as JSON
+        """
+        return {'table': self.table_path, 'overall': self.statistics(),
+                'tracks': {track_name: self.statistics(track_name) for track_name in self.track_names}}
+
+
+def evaluate(table_paths: list, controller_name: str = 'controller1', track_names: list = None, seeds: list = None,
+             bot_type: str = None, workers: int = None) -> list:
+    """
+    Races tables headlessly on every track, for every seed, in a pool of worker processes.
+
+    :param table_paths: tables to evaluate
+    :param controller_name: controller racing the tables (see registry)
+    :param track_names: tracks to race on, every track of tracks_config by default
+    :param seeds: seeds of the bomb layouts, DEFAULT_SEEDS layouts (seeded 0, 1, ...) by default
+    :param bot_type: type of bot racing alongside the car, can be set to None for no bot
+    :param workers: number of worker processes; defaults to the number of CPUs. With a single worker the races run in
+                    the current process.
+    :return: a Report per table, from the best mean score to the worst
+    """
+    table_paths = list(dict.fromkeys(table_paths))
+    if track_names is None:
+        track_names = [a_track.name for a_track in track.track.track_list]
+    if not seeds:
+        seeds = list(range(DEFAULT_SEEDS))
+    for track_name in track_names:
+        track.track.get_track(track_name)
+
+    jobs = [(controller_name, table_path, track_name, bot_type, seed)
+            for table_path in table_paths for track_name in track_names for seed in seeds]
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = min(workers, len(jobs))
+
+    if workers <= 1:
+        results = [run_evaluation(job) for job in jobs]
+    else:
+        with simulator.headless_pool(multiprocessing.Pool, workers) as pool:
+            results = pool.map(run_evaluation, jobs, chunksize=1)
+
+    reports = [Report(table_path, [race for race in results if race.table_path == table_path])
+               for table_path in table_paths]
+    return sorted(reports, key=lambda report: report.mean_score, reverse=True)
+
+
+def saved_tables(directory: str = 'params') -> list:
+    """
+    :return: paths of the tables saved in directory by learning runs, oldest first
+    """
+    return sorted(glob.glob('%s/*.txt' % directory))
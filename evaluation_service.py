@@ -0,0 +1,210 @@
+"""
+This module implements a long-lived service scoring Q-tables on the tracks, so that scoring many tables does not pay for
+starting Python, importing pygame and loading every track each time.
+
+The service listens on localhost (TCP, or a Unix socket) and keeps a pool of headless worker processes, each holding a
+ready Simulation of every track. Clients send requests as JSON objects, one per line:
+
+    {"table": "params/20190101120000_final.txt"}
+    {"table_data": "<base64 encoded table file>", "controller": "controller2", "tracks": ["track1"], "seeds": [0, 1]}
+
+    table / table_data: path of the table (as seen by the service) or content of the table file
+    controller: controller racing the table (see registry), controller1 by default
+    tracks: names of the tracks to race on, every track by default
+    seeds: seeds of the bomb layouts, a single random layout by default
+    bot: type of bot racing alongside the car, none by default
+
+Every race of a request runs on the pool and its score is sent back as soon as it is known, followed by a summary:
+
+    {"track": "track1", "seed": 0, "score": 1520.3, "checkpoints": 4, "grass_frames": 12}
+    {"track": "track1", "seed": 1, "error": "..."}
+    {"done": true, "mean": 1520.3, "races": 1}
+
+Tables are unpickled by the workers: only expose the service to users you would let run code on the machine.
+
+Example:
+    To start the service and score tables with it:
+
+        $ python AIRacers.py -j 4 serve
+        $ python AIRacers.py score params/*.txt
+"""
+import asyncio
+import base64
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import evaluation
+import simulator
+import tracks_config as track
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 5555
+# Longest request line accepted, in bytes (tables are sent inline, base64 encoded)
+MAX_REQUEST_SIZE = 64 * 1024 * 1024
+
+
+def _init_worker() -> None:
+    # Ctrl+C reaches the whole process group: the parent process stops the workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    simulator.init_worker()
+    for a_track in track.track.track_list:
+        evaluation.simulation(a_track.name, None)
+
+
+class EvaluationService:
+    def __init__(self, workers: int = None):
+        """
+        Scores tables on a pool of worker processes.
+
+        :param workers: number of worker processes; defaults to the number of CPUs
+        """
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self.pool = simulator.headless_pool(ProcessPoolExecutor, workers, _init_worker)
+
+    async def evaluate(self, request: dict):
+        """
+        Runs the races of a request.
+
+        :param request: a decoded request, see the module documentation
+        :return: asynchronous iterator over the responses to send back, the summary being the last one
+        """
+        controller_name = request.get('controller', 'controller1')
+        track_names = request.get('tracks') or [a_track.name for a_track in track.track.track_list]
+        seeds = request.get('seeds') or [None]
+        bot_type = request.get('bot')
+
+        for track_name in track_names:
+            track.track.get_track(track_name)
+
+        temporary_path = None
+        if 'table_data' in request:
+            descriptor, temporary_path = tempfile.mkstemp(suffix='.txt')
+            with os.fdopen(descriptor, 'wb') as table_file:
+                table_file.write(base64.b64decode(request['table_data']))
+            table_path = temporary_path
+        elif 'table' in request:
+            table_path = request['table']
+        else:
+            raise ValueError("Requests need a 'table' or a 'table_data'")
+
+        loop = asyncio.get_running_loop()
+
+        async def race(track_name, seed):
+            response = {'track': track_name, 'seed': seed}
+            try:
+                result = await loop.run_in_executor(
+                    self.pool, evaluation.run_evaluation, (controller_name, table_path, track_name, bot_type, seed))
+                response.update(score=result.score, checkpoints=result.checkpoints, grass_frames=result.grass_frames)
+            except Exception as error:
+                response['error'] = "%s: %s" % (type(error).__name__, error)
+            return response
+
+        try:
+            scores = []
+            for next_response in asyncio.as_completed([race(track_name, seed)
+                                                       for track_name in track_names for seed in seeds]):
+                response = await next_response
+                if 'score' in response:
+                    scores.append(response['score'])
+                yield response
+            yield {'done': True, 'mean': sum(scores) / len(scores) if scores else None, 'races': len(scores)}
+        finally:
+            if temporary_path is not None:
+                os.unlink(temporary_path)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Answers the requests of a client connection, one after the other.
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    async for response in self.evaluate(request):
+                        writer.write((json.dumps(response) + '\n').encode())
+                        await writer.drain()
+                except (ValueError, TypeError, AttributeError) as error:
+                    writer.write((json.dumps({'error': str(error), 'done': True}) + '\n').encode())
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, path: str = None) -> None:
+        """
+        Accepts connections until cancelled.
+
+        :param path: Unix socket to listen on instead of host and port
+        """
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle, path, limit=MAX_REQUEST_SIZE)
+        else:
+            server = await asyncio.start_server(self.handle, host, port, limit=MAX_REQUEST_SIZE)
+        print("Evaluation service listening on %s" % (path if path is not None else "%s:%d" % (host, port)))
+        async with server:
+            await server.serve_forever()
+
+    def close(self) -> None:
+        self.pool.shutdown(cancel_futures=True)
+
+
+def serve(workers: int = None, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, path: str = None) -> None:
+    """
+    Runs an evaluation service until interrupted.
+    """
+    service = EvaluationService(workers)
+    try:
+        asyncio.run(service.serve(host, port, path))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # A second Ctrl+C would interrupt the shutdown half way, leaving the workers behind
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        if path is not None and os.path.exists(path):
+            os.unlink(path)
+        service.close()
+
+
+def request_scores(table_path: str, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, path: str = None,
+                   send_data: bool = True, **request):
+    """
+    Asks a running service to score a table.
+
+    :param table_path: table to score
+    :param path: Unix socket of the service, instead of host and port
+    :param send_data: sends the content of the table instead of its path, for services that can't read the file
+    :param request: other request fields (controller, tracks, seeds, bot)
+    :return: iterator over the responses of the service, the summary being the last one
+    """
+    if send_data:
+        with open(table_path, 'rb') as table_file:
+            request['table_data'] = base64.b64encode(table_file.read()).decode()
+    else:
+        request['table'] = os.path.abspath(table_path)
+
+    if path is not None:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(path)
+    else:
+        connection = socket.create_connection((host, port))
+
+    with connection, connection.makefile('rwb') as stream:
+        stream.write((json.dumps(request) + '\n').encode())
+        stream.flush()
+        for line in stream:
+            response = json.loads(line)
+            yield response
+            if response.get('done'):
+                break
@@ -0,0 +1,118 @@
+"""
+This module trains a single Q-table with several processes at once.
+
+Each worker process runs its own headless Simulation and Controller, but every controller reads and writes the same
+table, which lives in shared memory (see controller1.qtable.SharedQTable). Updates are lock-free by default (Hogwild
+style: concurrent updates of the same state may occasionally overwrite each other, which barely matters for
+Q-learning); with lock stripes, each update of a state is atomic instead. A Q(lambda) update changes every state with
+an active trace, and holds the stripes of all of them.
+"""
+import multiprocessing
+import queue
+import random
+
+import numpy as np
+
+import curriculum
+import kernels
+import registry
+import simulator
+import tracks_config as track
+from controller1.qtable import SharedQTable, QTable
+
+
+def _train_worker(worker: int, q_table: SharedQTable, track_name: str, bot_type: str, controller_name: str,
+                  options: dict, episodes: int, seed: int, progress: multiprocessing.Queue,
+                  curriculum_name: str = None) -> None:
+    simulator.init_worker()
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+
+    controller = registry.create(controller_name, None, **options)
+    controller.q_table = q_table
+    simulation = simulator.Simulation(track.track.get_track(track_name), bot_type)
+    schedule = None
+    if curriculum_name is not None:
+        schedule = curriculum.create(curriculum_name, track.track.track_list, bot_type)
+        schedule.use(simulation)
+
+    for episode in range(episodes):
+        if schedule is not None:
+            simulation = schedule.simulation(schedule.choose_track(episode, episodes))
+        score = simulation.run_episode(controller, episode)
+        if schedule is not None:
+            schedule.record(simulation.track, score)
+        progress.put((worker, episode, simulation.track.name, score))
+        if controller.converged():
+            break
+
+    q_table.close()
+
+
+def shares_table(controller) -> bool:
+    """
+    :return: True if the table of the controller can live in shared memory, i.e. if it is a controller1 QTable
+    """
+    return isinstance(controller.q_table, QTable)
+
+
+def train(track_name: str, number_of_episodes: int, workers: int = None, controller_name: str = 'controller1',
+          table_path: str = None, bot_type: str = None, lock_stripes: int = 0, seed: int = None,
+          curriculum_name: str = None, **options) -> QTable:
+    """
+    Trains a table with several worker processes sharing it.
+
+    :param track_name: track every worker learns on
+    :param number_of_episodes: total number of episodes, split among the workers
+    :param workers: number of worker processes; defaults to the number of CPUs
+    :param controller_name: controller to train (see registry); its q_table must be a controller1 QTable
+    :param table_path: table to start from, None for a new one
+    :param bot_type: Type of bot racing alongside each worker's car, can be set to None for no bot
+    :param lock_stripes: 0 for lock-free updates, or the number of locks making state updates atomic
+    :param seed: worker i is seeded with seed + i
+    :param curriculum_name: curriculum (see curriculum.CURRICULA) each worker follows over every track, in which case
+                            track_name is only the first track they load
+    :param options: controller specific arguments, given to every worker's controller
+    :return: a regular QTable with the learned values
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    initial = registry.create(controller_name, table_path, **options)
+    if not shares_table(initial):
+        raise ValueError("%s does not learn a controller1 table, which workers cannot share" % controller_name)
+    shared = SharedQTable(initial.q_table.q_table, lock_stripes)
+    progress = multiprocessing.Queue()
+    kernels.warm_up()
+
+    try:
+        processes = []
+        for worker in range(workers):
+            episodes = number_of_episodes // workers + (1 if worker < number_of_episodes % workers else 0)
+            worker_seed = None if seed is None else seed + worker
+            processes.append(multiprocessing.Process(target=_train_worker, args=(
+                worker, shared, track_name, bot_type, controller_name, options, episodes, worker_seed, progress,
+                curriculum_name)))
+
+        for process in processes:
+            process.start()
+
+        finished = 0
+        while finished < number_of_episodes:
+            try:
+                worker, episode, race_track, score = progress.get(timeout=1)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    break
+                continue
+            finished += 1
+            print("worker", worker, "episode", episode, "track", race_track, "score", score)
+
+        for process in processes:
+            process.join()
+
+        return shared.to_qtable()
+    finally:
+        shared.close()
+        shared.unlink()
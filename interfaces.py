@@ -1,12 +1,12 @@
 from itertools import product
 from typing import List, Tuple, Any
 
-
-primes = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71, 73, 79, 83, 89, 97, 101,
-          103, 107, 109, 113, 127, 131, 137, 139, 149, 151, 157, 163, 167, 173, 179, 181, 191, 193)
+import numpy as np
 
 
 class State:
+    __slots__ = ('sensors',)
+
     def __init__(self, sensors: list):
         self.sensors = sensors
 
@@ -58,30 +58,81 @@ class State:
         features = self.discretize_features(self.compute_features())
         return features
 
-    @staticmethod
-    def get_state_id(discretized_features: Tuple) -> int:
+    @property
+    def state_id(self) -> int:
+        """
+        :return: the dense identifier (see get_state_id) of the discretized features associated with this state object.
         """
-        Handy function that calculates an unique integer identifier associated with the discretized state passed as parameter
+        return self.get_state_id(self.get_current_state())
+
+    @classmethod
+    def get_state_id(cls, discretized_features: Tuple) -> int:
+        """
+        Handy function that calculates an unique integer identifier associated with the discretized state passed as
+        parameter. Features are read as the digits of a mixed-radix number (the first feature being the most
+        significant one), so ids are dense in [0, get_number_of_states()) and follow the same order as
+        enumerate_all_possible_states().
         :param discretized_features
         :return: unique key
         """
+        s_id = 0
+        for level, feature in zip(cls.discretization_levels(), discretized_features):
+            s_id = s_id * level + int(feature)
+
+        return s_id
 
-        terms = [primes[i] ** discretized_features[i] for i in range(len(discretized_features))]
+    @classmethod
+    def get_state_from_id(cls, state_id: int) -> Tuple:
+        """
+        Inverse of get_state_id
+        :param state_id: an integer in [0, get_number_of_states())
+        :return: the discretized features associated with the given identifier
+        """
+        features = []
+        for level in reversed(cls.discretization_levels()):
+            state_id, feature = divmod(state_id, level)
+            features.append(feature)
 
-        s_id = 1
-        for i in range(len(discretized_features)):
-            s_id = s_id * terms[i]
+        return tuple(reversed(features))
 
-        return s_id
+    @classmethod
+    def get_radix_weights(cls) -> np.ndarray:
+        """
+        :return: the weight of each feature in the mixed-radix encoding used by get_state_id
+        """
+        levels = np.asarray(cls.discretization_levels(), dtype=np.int64)
+        weights = np.ones(len(levels), dtype=np.int64)
+        weights[:-1] = np.cumprod(levels[:0:-1])[::-1]
+        return weights
 
-    @staticmethod
-    def get_number_of_states() -> int:
+    @classmethod
+    def get_state_ids(cls, discretized_states: 'array of shape (n, number of features)') -> np.ndarray:
+        """
+        Vectorized version of get_state_id
+        :param discretized_states: one discretized state per row
+        :return: an array with the identifier of each row
+        """
+        return np.asarray(discretized_states, dtype=np.int64) @ cls.get_radix_weights()
+
+    @classmethod
+    def get_states_from_ids(cls, state_ids: 'array of n identifiers') -> np.ndarray:
+        """
+        Vectorized version of get_state_from_id
+        :param state_ids: identifiers computed by get_state_id/get_state_ids
+        :return: an array with one discretized state per row
+        """
+        levels = np.asarray(cls.discretization_levels(), dtype=np.int64)
+        state_ids = np.asarray(state_ids, dtype=np.int64)
+        return (state_ids[:, None] // cls.get_radix_weights()) % levels
+
+    @classmethod
+    def get_number_of_states(cls) -> int:
         """
         Handy function that computes the total number of possible states that exist in the system, according to the
         discretization levels specified by the user.
         :return: 
         """
-        v = State.discretization_levels()
+        v = cls.discretization_levels()
         num = 1
 
         for i in (v):
@@ -89,14 +140,14 @@ class State:
 
         return num
 
-    @staticmethod
-    def enumerate_all_possible_states() -> List:
+    @classmethod
+    def enumerate_all_possible_states(cls) -> List:
         """
         Handy function that generates a list with all possible states of the system.
         :return: List with all possible states
         """
 
-        levels = State.discretization_levels()
+        levels = cls.discretization_levels()
 
         levels_possibilities = [(j for j in range(i)) for i in levels]
 
@@ -149,10 +200,105 @@ class QTable:
         raise NotImplementedError()
 
 
+class GreedyPolicy:
+    def __init__(self, number_of_states: int):
+        """
+        Greedy action of every state (see State.get_state_id), for races where the Q-table does not change: choosing an
+        action is then a single array read. Actions of unknown states are 0. Ties go to the lowest action.
+
+        :param number_of_states: see State.get_number_of_states
+        """
+        self.actions = np.zeros(number_of_states, dtype=np.uint8)
+
+    @classmethod
+    def from_q_values(cls, q_values: np.ndarray) -> 'GreedyPolicy':
+        """
+        :param q_values: dense array of Q-values, one row per state id and one column per action (action a in column
+                         a - 1)
+        :return: the policy of every state
+        """
+        policy = cls(len(q_values))
+        policy.actions[:] = q_values.argmax(axis=1) + 1
+        return policy
+
+
 class Controller:
+    # State class used by this controller to interpret sensor readings
+    state_type = State
+    # Policy built by freeze(), None while the controller learns
+    policy = None
+
     def __init__(self, q_table: str):
         pass
 
+    def make_state(self, sensors: list, previous: State = None) -> State:
+        """
+        Builds the State object associated with the given sensor readings
+        :param sensors: The sensor readings of the car
+        :param previous: The state built for the same car on the previous frame, if any
+        :return: A State object
+        """
+        return self.state_type(sensors)
+
+    def act(self, sensors_batch: list) -> list:
+        """
+        Chooses the action of each car in a batch without exploring. This is what the simulator calls when evaluating
+        or racing a controller. The default implementation picks the action with the highest Q-value in self.q_table
+        (the lowest action on ties); controllers may override it with anything faster or smarter.
+        After freeze(), the action of each state is only computed the first time the state is seen.
+        :param sensors_batch: A list with the sensor readings of each car
+        :return: A list with the action chosen for each car
+        """
+        actions = []
+        for sensors in sensors_batch:
+            state = self.make_state(sensors)
+            action = 0 if self.policy is None else self.policy.actions[state.state_id]
+            if action == 0:
+                q_values = [self.q_table.get_q_value(state, i) for i in (1, 2, 3, 4, 5)]
+                action = q_values.index(max(q_values)) + 1
+                if self.policy is not None:
+                    self.policy.actions[state.state_id] = action
+            actions.append(int(action))
+        return actions
+
+    def freeze(self) -> None:
+        """
+        This method is called by the evaluate() and evaluate_comp() methods in simulator.Simulation() before racing, to
+        tell the controller its Q-table won't change until the next start_episode(). By default it sets up self.policy,
+        which act() fills as states are seen; controllers can precompute it instead.
+        """
+        self.policy = GreedyPolicy(self.state_type.get_number_of_states())
+
+    def attach(self, simulation, car) -> None:
+        """
+        This method is called by the evaluate() and evaluate_comp() methods in simulator.Simulation() before racing,
+        with the simulation and the car this controller drives. It does nothing by default; planning controllers keep
+        them to look ahead (see simulator.Simulation.snapshot).
+        """
+        pass
+
+    def start_episode(self) -> None:
+        """
+        This method is called by the learn() method in simulator.Simulation() before each race, so that learning state
+        which must not carry over from a race to the next (e.g. eligibility traces) can be reset. By default, it only
+        drops the policy built by freeze().
+        """
+        self.policy = None
+
+    def end_episode(self) -> None:
+        """
+        This method is called by the learn() method in simulator.Simulation() after each race. It does nothing by
+        default.
+        """
+        pass
+
+    def converged(self) -> bool:
+        """
+        This method is called by the learn() method in simulator.Simulation() after each race, which stops learning as
+        soon as it returns True. By default, controllers learn for every episode they are given.
+        """
+        return False
+
     def update_q(self, new_state: State, old_state: State, action: int, reward: float, end_of_race: bool) -> None:
         """
         This method is called by the learn() method in simulator.Simulation() to update your Q-table after each action is taken
@@ -0,0 +1,409 @@
+"""
+This module implements the hottest loops of the simulator: the track sonar, the colour lookups of the track mask and the
+distance to checkpoints.
+
+Track masks are handled as flat arrays of colour classes (one uint8 per pixel, in the order of PIL's getdata()) instead
+of lists of RGBA tuples, see classify_colors. The sonar can also use a distance field of the track (see distance_field)
+to jump over the pixels it knows to be drivable. Three interchangeable backends implement the kernels:
+
+    python: plain Python loops, the reference implementation
+    numpy:  vectorized NumPy version of the sonar, always available
+    numba:  the reference loops compiled by numba, used when numba is installed
+
+The backend is chosen when a kernel is first called (numba when available, numpy otherwise) and can be forced with the
+AIRACERS_KERNELS environment variable or set_backend(). numba is only imported when its backend is selected, and the
+compiled kernels are cached on disk, so only the first process using them pays for the compilation. Importing numba
+still takes longer than starting the rest of the simulator: short-lived processes racing little are better off with
+AIRACERS_KERNELS=python.
+
+Running this module checks that every available backend produces exactly the same readings as the reference one:
+
+    $ python kernels.py [track name ...]
+"""
+import importlib.util
+import math
+import os
+import random
+import sys
+
+import numpy as np
+
+from trigonometry import segment_distance as _segment_distance
+
+HAS_NUMBA = importlib.util.find_spec('numba') is not None
+
+# Colour classes of the track mask
+OTHER = 0
+ROAD = 1
+ROAD_ALT = 2
+ICE = 3
+GRASS = 4
+GRASS_ALT = 5
+
+PALETTE = {
+    (129, 126, 37, 255): ROAD,
+    (127, 125, 29, 255): ROAD_ALT,
+    (104, 165, 243, 255): ICE,
+    (85, 186, 54, 255): GRASS,
+    (106, 188, 44, 255): GRASS_ALT,
+}
+
+# Classes the track sonar goes through
+DRIVABLE = np.zeros(256, dtype=np.bool_)
+DRIVABLE[[ROAD, ROAD_ALT, ICE]] = True
+
+# Sonar arms: 100 points spaced by one pixel, starting 5 pixels ahead of the car, rotated by these offsets (radians)
+ARM_LENGTH = 100
+ARM_GAP = 5
+ARM_OFFSETS = (0.75, 0, -0.75)
+
+# Layout of the sonar output: left, center and right readings, class seen ahead of the car, then the (x, y) end point
+# of each arm in screen coordinates
+SONAR_SIZE = 10
+SONAR_FRONT_CLASS = 3
+
+_STEPS = np.arange(1, ARM_LENGTH + 1, dtype=np.float64)
+
+
+def classify_colors(pixels, nearest: bool = False) -> np.ndarray:
+    """
+    :param pixels: RGBA pixels, as an array whose last dimension has size 4 or a list of tuples
+    :param nearest: if True, every pixel gets the class of the closest palette colour (resampled masks contain blends
+                    of the palette colours along the borders); otherwise, colours out of the palette are OTHER
+    :return: flat uint8 array with the class of each pixel
+    """
+    pixels = np.asarray(pixels, dtype=np.uint8).reshape(-1, 4)
+
+    if nearest:
+        palette = np.array(list(PALETTE), dtype=np.int32)
+        distances = np.zeros((len(pixels), len(palette)), dtype=np.int32)
+        for channel in range(4):
+            difference = pixels[:, channel, None].astype(np.int32) - palette[None, :, channel]
+            distances += difference * difference
+        return np.array(list(PALETTE.values()), dtype=np.uint8)[distances.argmin(axis=1)]
+
+    pixels = pixels.astype(np.uint32)
+    packed = (pixels[:, 0] << 24) | (pixels[:, 1] << 16) | (pixels[:, 2] << 8) | pixels[:, 3]
+
+    classes = np.full(len(packed), OTHER, dtype=np.uint8)
+    for (r, g, b, a), color_class in PALETTE.items():
+        classes[packed == ((r << 24) | (g << 16) | (b << 8) | a)] = color_class
+    return classes
+
+
+def distance_field(classes: np.ndarray, width: int, height: int) -> np.ndarray:
+    """
+    Computes, for each pixel, how far the sonar can go from it without meeting anything it stops at.
+
+    :param classes: flat class map of a track
+    :return: flat uint8 array with the Chebyshev distance (capped at 255) from each pixel to the nearest pixel that is
+             not drivable or that the sonar treats as out of the track; 0 on those pixels
+    """
+    free = DRIVABLE[np.asarray(classes).reshape(height, width)]
+    # Sonar positions map to pixel (ry - 1) * width + rx with 0 < rx < width and 0 < ry < height
+    free[:, 0] = False
+    free[height - 1, :] = False
+
+    distances = np.zeros((height, width), dtype=np.uint8)
+    for distance in range(1, 256):
+        if not free.any():
+            break
+        distances[free] = distance
+        # Erodes the free pixels by one pixel in every direction, pixels outside of the image being blocked
+        padded = np.zeros((height + 2, width + 2), dtype=np.bool_)
+        padded[1:-1, 1:-1] = free
+        for dy in range(3):
+            for dx in range(3):
+                free &= padded[dy:dy + height, dx:dx + width]
+    return distances.reshape(-1)
+
+
+def checkpoint_segments(checkpoints: list) -> list:
+    """
+    :param checkpoints: checkpoint shapes
+    :return: the (ax, ay, bx, by) end points of each checkpoint
+    """
+    segments = []
+    for checkpoint in checkpoints:
+        p0, p1 = checkpoint.get_vertices()[:2]
+        segments.append((p0[0], p0[1], p1[0], p1[1]))
+    return segments
+
+
+def _build(jit):
+    """
+    Builds the loop based kernels, compiled with the given decorator.
+    """
+    @jit
+    def lookup(classes, pos):
+        # Same behaviour as indexing a Python list, falling back to the first pixel on IndexError
+        n = classes.shape[0]
+        if pos < 0:
+            pos += n
+        if pos < 0 or pos >= n:
+            pos = 0
+        return classes[pos]
+
+    @jit
+    def sonar(classes, distances, drivable, x, y, trig, width, height, out):
+        zero = y - y
+        for arm in range(3):
+            c = trig[arm, 0]
+            s = trig[arm, 1]
+            reading = 0
+            rx = 0
+            ry = 0
+            i = 1
+            while i <= ARM_LENGTH:
+                px = ARM_GAP + x + i
+                rx = int((px - x) * c + zero * s + x)
+                ry = int(height - ((zero * c - (x - px) * s) + y))
+                if arm == 1 and i == 1:
+                    # Same as lookup, which the compiled kernels can't call without losing their disk cache
+                    front = (ry - 1) * width + rx
+                    if front < 0:
+                        front += classes.shape[0]
+                    if front < 0 or front >= classes.shape[0]:
+                        front = 0
+                    out[SONAR_FRONT_CLASS] = classes[front]
+                reading = i
+                if rx <= 0 or ry <= 0 or rx >= width or ry >= height:
+                    break
+                pos = (ry - 1) * width + rx
+                color_class = classes[pos]
+                if not drivable[color_class]:
+                    break
+                if arm == 1:
+                    out[SONAR_FRONT_CLASS] = color_class
+                # j steps further, the truncated position has moved by at most j + 1 pixels, so the next
+                # distance - 2 steps are drivable and only the last of them needs to be read
+                i += max(1, min(int(distances[pos]) - 2, ARM_LENGTH - i))
+            out[arm] = reading
+            out[4 + 2 * arm] = rx
+            out[5 + 2 * arm] = ry
+        return out
+
+    return lookup, sonar, jit(_segment_distance)
+
+
+def _numpy_sonar(classes, distances, drivable, x, y, trig, width, height, out):
+    px = (ARM_GAP + x) + _STEPS
+    dx = px - x
+    ndx = x - px
+    zero = y - y
+    for arm in range(3):
+        c = trig[arm, 0]
+        s = trig[arm, 1]
+        rx = np.trunc((dx * c + zero * s) + x).astype(np.int64)
+        ry = np.trunc(height - ((zero * c - ndx * s) + y)).astype(np.int64)
+
+        outside = (rx <= 0) | (ry <= 0) | (rx >= width) | (ry >= height)
+        pos = (ry - 1) * width + rx
+        pos[outside] = 0
+        seen = classes[pos]
+        hit = outside | ~drivable[seen]
+
+        k = int(hit.argmax()) if hit.any() else ARM_LENGTH - 1
+        out[arm] = k + 1
+        out[4 + 2 * arm] = rx[k]
+        out[5 + 2 * arm] = ry[k]
+        if arm == 1:
+            if k > 0 or not hit[0]:
+                out[SONAR_FRONT_CLASS] = seen[k if not hit[k] else k - 1]
+            else:
+                out[SONAR_FRONT_CLASS] = _python_lookup(classes, (int(ry[0]) - 1) * width + int(rx[0]))
+    return out
+
+
+_python_lookup, _python_sonar, _python_segment_distance = _build(lambda function: function)
+
+# Kernels of each backend, None until first used
+_backends = {'python': (_python_lookup, _python_sonar, _python_segment_distance),
+             'numpy': (_python_lookup, _numpy_sonar, _python_segment_distance)}
+if HAS_NUMBA:
+    _backends['numba'] = None
+
+# Selected backend, None until a kernel is first called or set_backend is
+BACKEND = None
+
+# Distance fields of zeros (no jumps) used when the caller has none, by number of pixels
+_no_distances = {}
+
+
+def _backend(name: str) -> tuple:
+    """
+    :return: the lookup, sonar and segment_distance kernels of a backend, building them if needed
+    """
+    if name not in _backends:
+        raise ValueError("Unavailable kernel backend: %s" % name)
+    if _backends[name] is None:
+        import numba
+        _backends[name] = _build(numba.njit(cache=True))
+    return _backends[name]
+
+
+def set_backend(name: str) -> None:
+    """
+    :param name: one of available_backends()
+    """
+    global BACKEND, lookup, _sonar, segment_distance
+    lookup, _sonar, segment_distance = _backend(name)
+    BACKEND = name
+
+
+def available_backends() -> list:
+    return list(_backends)
+
+
+def read_only(array: np.ndarray) -> np.ndarray:
+    """
+    :return: a read-only view of array. Track maps are always given to the kernels read-only, like the memory-mapped
+             track caches, since numba compiles the kernels separately for writable arrays.
+    """
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+def warm_up() -> None:
+    """
+    Runs every kernel once, so that the numba backend is compiled (or loaded from its cache) right away. Processes
+    forked afterwards inherit the compiled kernels instead of each compiling them during their first race.
+    """
+    classes = read_only(np.zeros(4, dtype=np.uint8))
+    lookup(classes, 0)
+    sonar(classes, 1.0, 1.0, 0.0, 2, 2, distances=classes)
+    segment_distance(0.0, 0.0, 1.0, 1.0, 0.5, 0.5)
+
+
+def sonar(classes: np.ndarray, x: float, y: float, angle: float, width: int, height: int,
+          out: np.ndarray = None, distances: np.ndarray = None) -> np.ndarray:
+    """
+    Reads the three track sonar arms of a car.
+
+    :param classes: flat class map of the track (see classify_colors)
+    :param x: car x (pymunk coordinates)
+    :param y: car y (pymunk coordinates)
+    :param angle: car angle
+    :param width: track width
+    :param height: track height
+    :param out: int64 array of size SONAR_SIZE to write to, allocated if None
+    :param distances: distance field of classes (see distance_field); readings are the same without it, only slower
+    :return: out, see SONAR_SIZE for its layout
+    """
+    if out is None:
+        out = np.zeros(SONAR_SIZE, dtype=np.int64)
+    if distances is None:
+        distances = _no_distances.get(len(classes))
+        if distances is None:
+            distances = _no_distances[len(classes)] = read_only(np.zeros(len(classes), dtype=np.uint8))
+    trig = np.array([(math.cos(angle + offset), math.sin(angle + offset)) for offset in ARM_OFFSETS])
+    return _sonar(classes, distances, DRIVABLE, x, y, trig, width, height, out)
+
+
+def _select_default_backend() -> None:
+    set_backend(os.environ.get('AIRACERS_KERNELS', 'numba' if HAS_NUMBA else 'numpy'))
+
+
+# Until a backend is selected, the kernels select the default one on their first call and then forward to it: importing
+# this module never imports numba
+def lookup(classes, index):
+    _select_default_backend()
+    return lookup(classes, index)
+
+
+def segment_distance(x1, y1, x2, y2, x, y):
+    _select_default_backend()
+    return segment_distance(x1, y1, x2, y2, x, y)
+
+
+def _sonar(classes, distances, drivable, x, y, trig, width, height, out):
+    _select_default_backend()
+    return _sonar(classes, distances, drivable, x, y, trig, width, height, out)
+
+
+def check_parity(classes: np.ndarray, width: int, height: int, segments: list = (), samples: int = 2000,
+                 seed: int = 0, backends: list = None) -> list:
+    """
+    Compares every available backend with the python one on random car poses, including poses close to and beyond
+    the borders of the track. The python backend reads the sonar step by step while the others jump using the distance
+    field, except for numpy which reads every step at once.
+
+    :param classes: flat class map of a track
+    :param segments: checkpoint segments to measure distances to
+    :param backends: backends compared with the python one, every available backend by default
+    :return: list of mismatch descriptions, empty if all backends agree
+    """
+    rng = random.Random(seed)
+    reference_lookup, reference_sonar, reference_distance = _backends['python']
+    no_distances = np.zeros(len(classes), dtype=np.uint8)
+    distances = distance_field(classes, width, height)
+    drivable_pixels = np.flatnonzero(DRIVABLE[classes])
+    mismatches = []
+
+    for name in available_backends() if backends is None else backends:
+        other_lookup, other_sonar, other_distance = _backend(name)
+        for sample in range(samples):
+            if sample % 2 == 0 or len(drivable_pixels) == 0:
+                x = rng.uniform(-20, width + 20)
+                y = rng.uniform(-20, height + 20)
+            else:
+                # On the track, where the sonar goes further
+                pos = int(drivable_pixels[rng.randrange(len(drivable_pixels))])
+                x = pos % width + rng.random()
+                y = height - 1 - pos // width + rng.random()
+            angle = rng.uniform(-4 * math.pi, 4 * math.pi)
+            trig = np.array([(math.cos(angle + offset), math.sin(angle + offset)) for offset in ARM_OFFSETS])
+
+            expected = reference_sonar(classes, no_distances, DRIVABLE, x, y, trig, width, height,
+                                       np.zeros(SONAR_SIZE, np.int64))
+            got = other_sonar(classes, distances, DRIVABLE, x, y, trig, width, height, np.zeros(SONAR_SIZE, np.int64))
+            if not np.array_equal(expected, got):
+                mismatches.append("%s sonar at (%r, %r, %r): %s != %s" % (name, x, y, angle, got, expected))
+
+            pos = (height - int(y) - 1) * width + int(x)
+            if reference_lookup(classes, pos) != other_lookup(classes, pos):
+                mismatches.append("%s lookup at %d" % (name, pos))
+
+            for segment in segments:
+                if reference_distance(*segment, x, y) != other_distance(*segment, x, y):
+                    mismatches.append("%s distance from (%r, %r) to %s" % (name, x, y, segment))
+
+    return mismatches
+
+
+def check_track_parity(track_name: str, backends: list = None) -> list:
+    """
+    Runs check_parity on the class map and checkpoints of a track.
+
+    :param track_name: name of a track of tracks_config
+    :param backends: see check_parity
+    :return: list of mismatch descriptions, empty if all backends agree
+    """
+    import pymunk
+    import simulator
+    import trackcache
+    import tracks_config as track
+
+    a_track = track.track.get_track(track_name)
+    track_data = trackcache.load_or_build(a_track, simulator.width, simulator.height)
+    body = pymunk.Body(1, 1)
+    segments = checkpoint_segments([pymunk.Poly(body, pair) for pair in a_track.checkpoints])
+    return check_parity(np.asarray(track_data.classes), simulator.width, simulator.height, segments,
+                        backends=backends)
+
+
+if __name__ == '__main__':
+    import tracks_config as track
+
+    names = sys.argv[1:] or [a_track.name for a_track in track.track.track_list]
+    failed = False
+    for name in names:
+        mismatches = check_track_parity(name)
+        print("%s: %s" % (name, "ok" if not mismatches else "%d mismatches" % len(mismatches)))
+        for mismatch in mismatches[:10]:
+            print("    " + mismatch)
+        failed = failed or bool(mismatches)
+
+    print("backends: %s" % ", ".join(available_backends()))
+    sys.exit(1 if failed else 0)
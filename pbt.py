@@ -0,0 +1,147 @@
+"""
+This module implements population based training: a population of controllers learns in parallel worker processes and,
+every few episodes, the controllers learning worst start over from a copy of one of the best ones (its table and
+exploration state) with slightly different learning options. Good options, and good schedules of options, are found in a
+single run rather than by a series of sweeps.
+
+Members are sweep trials (see sweep.Trial), so they learn in the same worker processes and carry their training state
+from a run to the next in the same way. The perturbed options are attributes of controller1.controller.Controller.
+
+Example:
+    To train 8 controllers on 500 episodes, starting from random learning rates:
+
+        $ python AIRacers.py -e 500 pbt alpha=0.1:0.9 --population 8
+"""
+import copy
+import datetime
+import multiprocessing
+import random
+import statistics
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import simulator
+import sweep
+
+# Controller attribute -> (lowest value, highest value, perturbed through its distance to 1) of the options perturbed
+# when a member copies another one. Options close to 1 are perturbed through their distance to 1, which scales the
+# horizon of atten and the cooling time of cooling_factor rather than pushing them past 1.
+PERTURBED = {
+    'alpha': (0.001, 1.0, False),
+    'atten': (0.0, 0.999, True),
+    'cooling_factor': (0.5, 0.9999, True),
+}
+# Factors applied at random to each perturbed option
+PERTURBATIONS = (0.8, 1.2)
+# Exploration state copied along with the table
+EXPLORATION = ('temperature', 'eps', 'episode_number')
+# Fraction of the population copying the best members, and fraction being copied
+TRUNCATION = 0.25
+
+
+def recent_score(member: sweep.Trial, interval: int) -> float:
+    """
+    :return: mean score of the member over its last interval episodes
+    """
+    return statistics.mean(member.scores[-interval:])
+
+
+def exploit(member: sweep.Trial, donor: sweep.Trial, rng: random.Random) -> None:
+    """
+    Makes a member go on from a copy of the table and exploration state of donor, with donor's options perturbed.
+    """
+    member.controller.q_table = copy.deepcopy(donor.controller.q_table)
+    for name in EXPLORATION:
+        if hasattr(donor.controller, name):
+            setattr(member.controller, name, getattr(donor.controller, name))
+
+    options = {}
+    for name, (lowest, highest, from_one) in PERTURBED.items():
+        if hasattr(donor.controller, name):
+            value = getattr(donor.controller, name)
+            if from_one:
+                value = 1 - (1 - value) * rng.choice(PERTURBATIONS)
+            else:
+                value = value * rng.choice(PERTURBATIONS)
+            options[name] = min(max(value, lowest), highest)
+            setattr(member.controller, name, options[name])
+    member.options = dict(member.options, **options)
+
+
+def run(population: list, number_of_episodes: int, interval: int, track_name: str,
+        controller_name: str = 'controller1', bot_type: str = None, curriculum_name: str = None, workers: int = None,
+        seed: int = None, results_path: str = None, **options) -> list:
+    """
+    Trains a population in a pool of worker processes.
+
+    :param population: initial options of each member, as returned by sweep.grid or sweep.sample
+    :param number_of_episodes: number of learning episodes of each member
+    :param interval: number of episodes between two comparisons of a member with the rest of the population
+    :param track_name: track the members learn on
+    :param curriculum_name: curriculum (see curriculum.CURRICULA) each member follows over every track instead
+    :param workers: number of worker processes; defaults to the number of CPUs. With a single worker the members learn
+                    in the current process.
+    :param seed: member i is seeded with seed + i, copies and perturbations are seeded with seed
+    :param results_path: CSV file receiving the results table, ./results/pbt_<date>.csv by default
+    :param options: controller options shared by every member, overridden by the member options
+    :return: the sweep.Trial of every member, from the best evaluation score to the worst
+    """
+    stamp = datetime.datetime.fromtimestamp(time.time()).strftime('%Y%m%d%H%M%S')
+    if results_path is None:
+        results_path = "./results/pbt_%s.csv" % stamp
+    rng = random.Random(seed)
+    # Latest state of each member, as it was at the end of its last run
+    members = [sweep.Trial(number, member_options, "./params/pbt_%s_%d.txt" % (stamp, number))
+               for number, member_options in enumerate(population)]
+    ready = deque(members)
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = min(workers, len(members))
+
+    def job(member):
+        episodes = min(len(member.scores) + interval, number_of_episodes)
+        return (member, episodes, options, controller_name, track_name, bot_type, curriculum_name, number_of_episodes,
+                seed)
+
+    def update(member):
+        members[member.number] = member
+        if member.evaluation_score is not None:
+            print("member %d %s: final %.1f, evaluation %.1f, %.1f episodes/s"
+                  % (member.number, member.options, member.final_score, member.evaluation_score,
+                     member.episodes_per_second))
+            return
+
+        # Only members which are still learning can be copied
+        learning = [other for other in members if other.controller is not None and other.scores]
+        ranked = sorted(learning, key=lambda other: recent_score(other, interval), reverse=True)
+        cut = max(1, int(len(ranked) * TRUNCATION))
+        if len(ranked) > cut and member in ranked[-cut:]:
+            donor = rng.choice(ranked[:cut])
+            exploit(member, donor, rng)
+            print("member %d copies member %d after %d episodes (%.1f against %.1f): %s"
+                  % (member.number, donor.number, len(member.scores), recent_score(member, interval),
+                     recent_score(donor, interval), member.options))
+        ready.append(member)
+
+    start = time.perf_counter()
+    if workers <= 1:
+        while ready:
+            update(sweep.run_trial(job(ready.popleft())))
+    else:
+        with simulator.headless_pool(ProcessPoolExecutor, workers) as pool:
+            running = set()
+            while ready or running:
+                while ready and len(running) < workers:
+                    running.add(pool.submit(sweep.run_trial, job(ready.popleft())))
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    update(future.result())
+    seconds = time.perf_counter() - start
+
+    results = sorted(members, key=lambda member: member.evaluation_score, reverse=True)
+    sweep.save_results(results, results_path)
+    print("%d members in %.1f s, best: %s (%.1f), results saved to %s"
+          % (len(results), seconds, results[0].table_path, results[0].evaluation_score, results_path))
+    return results
@@ -0,0 +1 @@
+from planner.controller import Controller
@@ -0,0 +1,152 @@
+"""
+A controller looking ahead before every action: from the current state of the race (see Simulation.snapshot), it plays
+each of the 5 actions followed by a few greedy frames of a tabular controller, values these rollouts with the score the
+car gains plus the Q-value of the state they end in, and takes the action of the best one. Planning stops at the end of
+the time budget of the frame, keeping the best action found so far; the greedy action is always tried first.
+
+The planner only plans when racing (Simulation.evaluate and evaluate_comp attach it to its car); everything else, and
+learning in particular, is left to the tabular controller it wraps, whose table it loads.
+
+Example:
+    To race the table of controller1 with lookahead against controller2:
+
+        $ python AIRacers.py comp planner=controller1/table.txt controller2
+"""
+import random
+import time
+
+import interfaces as controller_template
+import registry
+
+ACTIONS = (1, 2, 3, 4, 5)
+# Frames of each rollout, the first one included
+HORIZON = 8
+# Seconds of planning per frame
+FRAME_BUDGET = 0.02
+# Attenuation of the Q-value at the end of a rollout, for leaf controllers which don't have one
+ATTEN = 0.9
+
+
+class Controller(controller_template.Controller):
+    def __init__(self, q_table_path: str, leaf: str = 'controller1', horizon: int = HORIZON,
+                 frame_budget: float = FRAME_BUDGET, **options):
+        """
+        :param q_table_path: table of the leaf controller, None for a new one
+        :param leaf: name of the tabular controller (see registry) choosing rollout actions and giving leaf values
+        :param horizon: number of frames of each rollout
+        :param frame_budget: seconds of planning per frame
+        :param options: options of the leaf controller
+        """
+        self.leaf = registry.create(leaf, q_table_path, **options)
+        self.state_type = self.leaf.state_type
+        self.horizon = max(1, horizon)
+        self.frame_budget = frame_budget
+
+        # Set by attach: the race being planned and the car driven
+        self.simulation = None
+        self.car = None
+        # State of the car on the previous frame, the leaf features may depend on it
+        self.previous_state = None
+        # Number of frames planned, and of frames where the budget ran out before every action was tried
+        self.planned_frames = 0
+        self.truncated_frames = 0
+
+    def __getattr__(self, name: str):
+        # Tables, exploration state and options are the leaf controller's
+        if name == 'leaf':
+            raise AttributeError(name)
+        return getattr(self.leaf, name)
+
+    def attach(self, simulation, car) -> None:
+        self.simulation = simulation
+        self.car = car
+        self.previous_state = None
+
+    def freeze(self) -> None:
+        self.leaf.freeze()
+
+    def greedy_action(self, state: controller_template.State) -> int:
+        """
+        :return: the action with the highest Q-value in state, the lowest action on ties
+        """
+        q_values = [self.leaf.q_table.get_q_value(state, action) for action in ACTIONS]
+        return q_values.index(max(q_values)) + 1
+
+    def rollout(self, root: controller_template.State, action: int) -> float:
+        """
+        Plays action then greedy actions for the rest of the horizon, from the state the simulation is in.
+        :return: score gained by the car during the rollout plus the discounted best Q-value of the state it ends in
+        """
+        leaf, simulation, car = self.leaf, self.simulation, self.car
+        start = car.score
+        state = root
+        for frame in range(self.horizon):
+            if frame > 0:
+                action = self.greedy_action(state)
+            state = leaf.make_state(simulation.lookahead_step(car, action), state)
+        discount = getattr(leaf, 'atten', ATTEN) ** self.horizon
+        return car.score - start + discount * max(leaf.q_table.get_q_value(state, action) for action in ACTIONS)
+
+    def plan(self, sensors: list) -> int:
+        """
+        :return: the action whose rollout is worth the most, among the actions tried within the frame budget
+        """
+        deadline = time.perf_counter() + self.frame_budget
+        root = self.leaf.make_state(sensors, self.previous_state)
+        self.previous_state = root
+        greedy = self.greedy_action(root)
+
+        simulation = self.simulation
+        snapshot = simulation.snapshot()
+        # Bots may draw random actions during rollouts, the race goes on as if they had not
+        random_state = random.getstate()
+        best_action, best_value, tried = greedy, None, 0
+        for action in (greedy,) + tuple(action for action in ACTIONS if action != greedy):
+            if time.perf_counter() >= deadline:
+                break
+            try:
+                value = self.rollout(root, action)
+            finally:
+                simulation.restore(snapshot)
+                random.setstate(random_state)
+            tried += 1
+            if best_value is None or value > best_value:
+                best_action, best_value = action, value
+
+        self.planned_frames += 1
+        if tried < len(ACTIONS):
+            self.truncated_frames += 1
+        return best_action
+
+    def act(self, sensors_batch: list) -> list:
+        """
+        Plans the action of the attached car; batches of other cars are left to the leaf controller.
+        """
+        if self.simulation is None or len(sensors_batch) != 1:
+            return self.leaf.act(sensors_batch)
+        return [self.plan(sensors_batch[0])]
+
+    def make_state(self, sensors: list, previous: controller_template.State = None) -> controller_template.State:
+        return self.leaf.make_state(sensors, previous)
+
+    def start_episode(self) -> None:
+        self.simulation = None
+        self.car = None
+        self.leaf.start_episode()
+
+    def end_episode(self) -> None:
+        self.leaf.end_episode()
+
+    def converged(self) -> bool:
+        return self.leaf.converged()
+
+    def update_q(self, new_state: controller_template.State, old_state: controller_template.State, action: int,
+                 reward: float, end_of_race: bool) -> None:
+        self.leaf.update_q(new_state, old_state, action, reward, end_of_race)
+
+    def compute_reward(self, new_state: controller_template.State, old_state: controller_template.State, action: int,
+                       n_steps: int, end_of_race: bool) -> float:
+        return self.leaf.compute_reward(new_state, old_state, action, n_steps, end_of_race)
+
+    def take_action(self, new_state: controller_template.State, episode_number: int) -> int:
+        return self.leaf.take_action(new_state, episode_number)
@@ -3,7 +3,7 @@ __version__ = "$Id$"
 
 import os.path
 import platform
-import sys, imp, os
+import sys, os
 import ctypes
  
 def platform_specific_functions():
@@ -32,8 +32,7 @@ def load_library(libname, debug_lib=True):
     
     try:
         if hasattr(sys, "frozen") or \
-            hasattr(sys, "importers") or \
-            hasattr(imp, "is_frozen") and imp.is_forzen("__main__"):
+            hasattr(sys, "importers"):
             if 'site-packages.zip' in __file__:
                 path = os.path.join(os.path.dirname(os.getcwd()), 'Frameworks')
             else:
@@ -0,0 +1,126 @@
+"""
+This module keeps track of the controllers that can be trained, evaluated or raced, so that neither the simulator nor
+the command line need to import a specific controller package.
+
+A controller is found by name, in this order:
+    1. names registered with register() (controller1, controller2 and planner are registered here);
+    2. entry points of the 'ai_racers.controllers' group exposed by installed packages;
+    3. 'package.module:attribute' paths, importing the module on demand.
+
+Whatever is found is a factory called as factory(table_path, **options) which must return an interfaces.Controller.
+Learning modes only give a controller the learning options its factory takes (see accepted_options), and only train
+controllers which implement Controller.update_q (see can_learn).
+"""
+import importlib
+import inspect
+
+import interfaces
+
+ENTRY_POINT_GROUP = 'ai_racers.controllers'
+
+# name -> (factory or 'module:attribute' path, default table)
+_controllers = {}
+
+
+def register(name: str, factory, default_table: str = None) -> None:
+    """
+    Makes a controller available under the given name.
+
+    :param name: Name used to select the controller
+    :param factory: A callable, or a 'module:attribute' path to one, building the controller
+    :param default_table: Table raced by the controller when none is specified (e.g. in competition mode)
+    """
+    _controllers[name] = (factory, default_table)
+
+
+def _import_path(path: str):
+    module_name, _, attribute = path.partition(':')
+    obj = importlib.import_module(module_name)
+    for part in attribute.split('.'):
+        obj = getattr(obj, part)
+    return obj
+
+
+def _entry_points() -> list:
+    # importlib.metadata takes longer to import than most of the simulator: only load it when looking for entry points
+    from importlib import metadata
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+        return list(entry_points.select(group=ENTRY_POINT_GROUP))
+    return list(entry_points.get(ENTRY_POINT_GROUP, []))
+
+
+def get_factory(name: str):
+    """
+    :param name: a registered name, an entry point name or a 'module:attribute' path
+    :return: the factory of the requested controller
+    """
+    if name in _controllers:
+        factory = _controllers[name][0]
+        return _import_path(factory) if isinstance(factory, str) else factory
+
+    for entry_point in _entry_points():
+        if entry_point.name == name:
+            return entry_point.load()
+
+    if ':' in name:
+        return _import_path(name)
+
+    raise ValueError("Unknown controller: %s (available: %s)" % (name, ', '.join(available())))
+
+
+def default_table(name: str) -> str:
+    """
+    :return: the table registered along with the controller, None if there is none
+    """
+    if name in _controllers:
+        return _controllers[name][1]
+    return None
+
+
+def create(name: str, table_path: str = None, **options):
+    """
+    Builds a controller.
+
+    :param name: see get_factory
+    :param table_path: Q-table to load, None for a new one
+    :param options: controller specific arguments (e.g. atten, alpha, init_temp and strategy for controller1)
+    :return: an interfaces.Controller
+    """
+    return get_factory(name)(table_path, **options)
+
+
+def accepted_options(name: str, options: dict) -> dict:
+    """
+    :param name: see get_factory
+    :param options: controller specific arguments, as for create
+    :return: the options which the factory of the controller takes, all of them if it takes **options
+    """
+    parameters = inspect.signature(get_factory(name)).parameters.values()
+    if any(parameter.kind is parameter.VAR_KEYWORD for parameter in parameters):
+        return dict(options)
+    names = {parameter.name for parameter in parameters}
+    return {option: value for option, value in options.items() if option in names}
+
+
+def can_learn(name: str) -> bool:
+    """
+    :param name: see get_factory
+    :return: True if the controller implements update_q; factories which are not classes are assumed to
+    """
+    factory = get_factory(name)
+    if not isinstance(factory, type):
+        return True
+    return factory.update_q is not interfaces.Controller.update_q
+
+
+def available() -> list:
+    """
+    :return: names of the registered controllers and of the installed entry points
+    """
+    return sorted(set(_controllers) | {entry_point.name for entry_point in _entry_points()})
+
+
+register('controller1', 'controller1.controller:Controller', 'controller1/table.txt')
+register('controller2', 'controller2.controller:Controller', 'controller2/table.txt')
+register('planner', 'planner.controller:Controller', 'controller1/table.txt')
@@ -12,18 +12,15 @@ import sys
 import os
 
 import numpy as np
-import pygame
-from PIL import Image
-from pygame.color import THECOLORS
 
 import pymunk as pymunk
 from pymunk import Vec2d
-from pymunk.pygame_util import draw
 from trigonometry import *
-from controller1 import Controller, State
-from controller2.controller import Controller as Controller2
-from controller2.controller import State as State2
+import kernels
+import trackcache
+from interfaces import Controller
 import datetime, time
+import contextlib
 
 import csv
 # PyGame screen dimensions
@@ -33,6 +30,17 @@ height = 700
 # Gui Flag
 show_simulation = True
 
+# pygame and pymunk's pygame drawing function, imported by import_pygame: headless simulations never load them
+pygame = None
+draw = None
+
+# Colours of the shapes drawn by pymunk (same values as pygame's THECOLORS)
+COLORS = {
+    'green': (0, 255, 0, 255),
+    'yellow': (255, 255, 0, 255),
+    'black': (0, 0, 0, 255),
+}
+
 # Velocity constants shared among classes in this module
 VEL_MIN = 10
 VEL_MAX = 200
@@ -44,12 +52,80 @@ CHECKPOINT_COLLISION_TYPE = 501
 RADAR_COLLISION_TYPE = 502
 BOMB_COLLISION_TYPE = 503
 
+# Sensor readings of a car, in the order of _Car.sensors. Every car keeps them in a record of this type, so the readings
+# can also be read by name (car.readings['on_track'])
+SENSOR_DTYPE = np.dtype([
+    ('track_distance_left', np.int64),
+    ('track_distance_center', np.int64),
+    ('track_distance_right', np.int64),
+    ('on_track', np.int64),
+    ('checkpoint_distance', np.float64),
+    ('car_velocity', np.int64),
+    ('enemy_distance', np.float64),
+    ('enemy_position_angle', np.float64),
+    ('enemy_detected', np.int64),
+    ('checkpoint', np.int64),
+    ('incoming_track', np.int64),
+    ('bomb_detected', np.int64),
+    ('bomb_distance', np.float64),
+    ('bomb_position_angle', np.float64),
+])
+NUM_SENSORS = len(SENSOR_DTYPE.names)
+# Duration of the step Simulation.restore takes to find contacts, too short for bodies to move noticeably
+CONTACT_STEP = 1e-9
+
 #images to be used
 car_image = "assets/car.png"
 bot_image = "assets/bot.png"
 bomb_image = "assets/bomb.png"
+explosion_image = "assets/explosion.png"
+
+# Sprites are loaded once per process and shared by every car/bomb using them
+_images = {}
+
+
+def import_pygame() -> None:
+    """
+    Imports pygame, which is only needed to render the simulation. It takes longer than importing the rest of the
+    simulator, so it is not imported along with this module.
+    """
+    global pygame, draw
+    if pygame is None:
+        import pygame
+        from pymunk.pygame_util import draw
+
 
-explosion_shape = pygame.image.load('assets/explosion.png')
+def init_worker() -> None:
+    """
+    Prepares a worker process of headless_pool: its simulations are not rendered.
+    """
+    global show_simulation
+    show_simulation = False
+
+
+def headless_pool(pool_type, workers: int, initializer=init_worker):
+    """
+    Starts a pool of worker processes racing headless simulations. The kernels are compiled (see kernels.warm_up) before
+    the workers start, so that they load them from the cache instead of each compiling them.
+
+    :param pool_type: multiprocessing.Pool or concurrent.futures.ProcessPoolExecutor
+    :param workers: number of worker processes
+    :param initializer: called by every worker as it starts; it must call init_worker
+    :return: the pool
+    """
+    kernels.warm_up()
+    return pool_type(workers, initializer=initializer)
+
+
+def load_image(img_path: str) -> 'pygame.Surface':
+    """
+    :param img_path: path to an image
+    :return: the (cached) pygame image
+    """
+    if img_path not in _images:
+        import_pygame()
+        _images[img_path] = pygame.image.load(img_path)
+    return _images[img_path]
 
 
 def block_print():
@@ -63,6 +139,15 @@ def enable_print():
     sys.stdout = sys.__stdout__
 
 
+def get_pixel_index(x: int, y: int) -> int:
+    """
+    :param x: pymunk x coordinate
+    :param y: pymunk y coordinate
+    :return: position of the pixel in flat track images (rgb lists and class maps)
+    """
+    return (height - y - 1) * width + x
+
+
 def get_point_from_rgb_list(x: int, y: int, image_vector: 'list of rgb elements') -> list:
     """
     Get point from pygame rgb vector using pymunk coordinates
@@ -71,25 +156,14 @@ def get_point_from_rgb_list(x: int, y: int, image_vector: 'list of rgb elements'
     :param image_vector: pygame Image
     :return: an list that contain a rgb vector
     """
-    pos = (height - y - 1) * width + x
+    pos = get_pixel_index(x, y)
     try:
         return image_vector[pos]
     except IndexError:
         return image_vector[0]
 
 
-# The following five functions are collision functions used by pymunk collision handler
-
-def mark_checkpoint(game, attribute):
-    """
-    Function to handle pymunk collision calls for checkpoints
-    """
-    for shape in attribute.shapes:
-        if shape.collision_type != CHECKPOINT_COLLISION_TYPE:
-            shape.class_bound.mark_checkpoint(game, attribute)
-
-    return True
-
+# The following four functions are collision functions used by pymunk collision handler
 
 def crash_penalty(game, attribute):
     """
@@ -129,15 +203,42 @@ def remove_obstacle_from_list(game, attribute):
     return True
 
 
-class Background(pygame.sprite.Sprite):
+def stop_body(body: pymunk.Body) -> None:
+    """
+    Stops a body, including the bias velocities pymunk uses to push overlapping shapes apart on the next step. Bodies
+    removed from the space while touching something keep them, and would be pushed once added back.
+    """
+    body.velocity = (0, 0)
+    body.angular_velocity = 0
+    body_struct = body._body.contents
+    body_struct.v_bias_private.x = 0
+    body_struct.v_bias_private.y = 0
+    body_struct.w_bias_private = 0
+
+
+def add_collision_handlers(space: pymunk.Space) -> None:
+    """
+    Registers the collision handlers used by cars and bombs. This must be done exactly once per space.
+    """
+    space.add_collision_handler(CAR_COLLISION_TYPE, CAR_COLLISION_TYPE, begin=crash_penalty,
+                                separate=disable_carsh_penality)
+    space.add_collision_handler(RADAR_COLLISION_TYPE, CAR_COLLISION_TYPE, begin=detect_obstacle,
+                                separate=remove_obstacle_from_list)
+    space.add_collision_handler(CAR_COLLISION_TYPE, BOMB_COLLISION_TYPE, begin=crash_penalty,
+                                separate=disable_carsh_penality)
+    space.add_collision_handler(RADAR_COLLISION_TYPE, BOMB_COLLISION_TYPE, begin=detect_obstacle,
+                                separate=remove_obstacle_from_list)
+
+
+class Background:
     def __init__(self, image_path: str, location: (int, int)):
         """
-        # Simple class extension to make easier to draw background
+        # Simple class to make easier to draw background
 
         :param image_path:
         :param location:
         """
-        pygame.sprite.Sprite.__init__(self)  # call Sprite initializer
+        import_pygame()
         self.image = pygame.image.load(image_path)
         self.image = pygame.transform.scale(self.image, (width, height))
         self.rect = self.image.get_rect()
@@ -175,41 +276,60 @@ class BombShape(pymunk.Circle):
 class _Car:
 
     ACTION_LIST = (1, 2, 3, 4, 5)
+    # Attributes saved by snapshot along with the pymunk body, see Simulation.snapshot
+    SNAPSHOT_ATTRIBUTES = ('frame_count', 'grass_penalty', 'punctuation', 'checkpoints_reached', 'current_checkpoint',
+                           'checkpoint_sensor', 'crash_timer', 'crashed', 'on_track', 'obs', 'first',
+                           'current_checkpoint_distance', 'last_checkpoint_distance', 'last_position',
+                           'obstacle_distance', 'obstacle_body_position_angle', 'car_direction', 'sensors_ready')
 
     def __init__(self, space, track, position, track_rgb, off_track_color, checkpoints, radar_collision_type,
-                 img_path,screen=None):
+                 img_path,screen=None, track_classes=None, track_distances=None):
         """
         This class is used to represent a Car in the Simulation, it handles movement and sensors.
 
         :param space: pymunk space
         :param track: Track object which contains
         :param position: tuple containing x,y coordinates
-        :param track_rgb: rgb vector containing track information
+        :param track_rgb: rgb vector containing track information, only needed if track_classes is None
         :param off_track_color: collor that represent off_track in track_rgb
         :param checkpoints: list of checkpoints the game is using
         :param radar_collision_type: integer representing
         :param screen: Pymunk screen
+        :param track_classes: track_rgb converted by kernels.classify_colors, computed if None
+        :param track_distances: distance field of track_classes (see kernels.distance_field), None if there is none
         """
 
         # Initializing class variables
         self.enemy_detected = False
-        self.car_img_shape = pygame.image.load(img_path)
+        self.img_path = img_path
+        self.sprite_path = img_path
         self.radar_collision_type = radar_collision_type
         self.position = position
         self.punctuation = 0
         self.grass_penalty = 0
+        self.checkpoints_reached = 0
         self.max_checkpoints = len(track.checkpoints)
         self.space = space
         self.track = track
         self.off_track_color = off_track_color
         self.track_rgb = track_rgb
+        self.track_classes = kernels.read_only(track_classes if track_classes is not None else
+                                               kernels.classify_colors(track_rgb))
+        self.track_distances = track_distances
         self._create_new_car_body()
         self.current_checkpoint_distance = 0
         self.last_checkpoint_distance = 0
         self.checkpoints = checkpoints
+        self.checkpoint_segments = kernels.checkpoint_segments(checkpoints)
+        # Position of the car when checkpoints were last checked, see read_sensors
+        self.last_position = tuple(self.car_body.position)
+        self.sonar_readings = np.zeros(kernels.SONAR_SIZE, dtype=np.int64)
+        # Sensor readings of the last read_sensors call (see SENSOR_DTYPE), a view of a one record array
+        self.readings_record = np.zeros(1, dtype=SENSOR_DTYPE)
+        self.readings = self.readings_record[0]
+        self.sensors_ready = False
         self.current_checkpoint = 0
         self.obstacle_body_position_angle = 0
-        self.point_in_front = 0
         self.car_direction = 0
         self.crashed = False
         self.on_track = True
@@ -224,17 +344,6 @@ class _Car:
         self.obs = 0
         self.crash_timer = 0
 
-        # Add Pymunk's collision handling if that wasn't done before
-        self.space.add_collision_handler(CAR_COLLISION_TYPE, CHECKPOINT_COLLISION_TYPE, begin=mark_checkpoint)
-        self.space.add_collision_handler(CAR_COLLISION_TYPE, CAR_COLLISION_TYPE, begin=crash_penalty,
-                                         separate=disable_carsh_penality)
-        self.space.add_collision_handler(RADAR_COLLISION_TYPE, CAR_COLLISION_TYPE, begin=detect_obstacle,
-                                         separate=remove_obstacle_from_list)
-        self.space.add_collision_handler(CAR_COLLISION_TYPE, BOMB_COLLISION_TYPE, begin=crash_penalty,
-                                         separate=disable_carsh_penality)
-        self.space.add_collision_handler(RADAR_COLLISION_TYPE, BOMB_COLLISION_TYPE, begin=detect_obstacle,
-                                         separate=remove_obstacle_from_list)
-
         # Creates screen instance if in evaluate mode
         if show_simulation:
             self.screen = screen
@@ -253,9 +362,9 @@ class _Car:
 
         driving_direction = Vec2d(1, 0).rotated(self.car_body.angle)
         t_x, t_y = self.car_body.position
-        current_color = get_point_from_rgb_list(int(t_x), int(t_y), self.track_rgb)
+        current_class = kernels.lookup(self.track_classes, get_pixel_index(int(t_x), int(t_y)))
 
-        if current_color == self.ice_track_color:
+        if current_class == kernels.ICE:
             self.on_track = 2
             # Turning actions
             if action == 1:  # Turn right.
@@ -278,7 +387,7 @@ class _Car:
         if self.crashed:
             self.crash_timer = 5
             # self.crashed is updated by self.disable_crash_penalty method
-        elif (current_color == self.on_track_color) or (current_color == (127, 125, 29, 255)):
+        elif current_class == kernels.ROAD or current_class == kernels.ROAD_ALT:
             # Updates velocity normally
             self.on_track = 1
             if action == 3:
@@ -291,7 +400,7 @@ class _Car:
                     vel -= 50
                 else:
                     vel = VEL_MIN
-        elif current_color == self.off_track_color or (current_color == (106, 188, 44, 255)):
+        elif current_class == kernels.GRASS or current_class == kernels.GRASS_ALT:
             # Check if car is off track and if so gradually slows its current velocity
             self.on_track = 0
             self.grass_penalty += 1
@@ -327,7 +436,7 @@ class _Car:
             p = Vec2d(p.x, height - p.y)
 
             # Transform image to right size and flips it
-            new_img = pygame.transform.scale(self.car_img_shape, (40, 20))
+            new_img = pygame.transform.scale(load_image(self.sprite_path), (40, 20))
             new_img = pygame.transform.flip(new_img, True, False)
 
             # Rotates image and place it at cars position
@@ -345,17 +454,24 @@ class _Car:
         """
         rectangle = [(-20, -10), (-20, 10), (20, 10), (20, -10)]
         self.car_body = pymunk.Body(100, pymunk.inf)
-        self.car_body.position = self.position[0], self.position[1]
         self.car_shape = CarShape(self.car_body, rectangle, self)
-        self.car_shape.color = THECOLORS["green"]
+        self.car_shape.color = COLORS["green"]
         self.car_shape.elasticity = 0
-        self.car_body.angle = self.track.angle_of_cars
         self.car_shape.collision_type = CAR_COLLISION_TYPE
+        self._place_car_body()
+        self.space.add(self.car_body, self.car_shape)
+        self.car_radar = self._create_radar_sensor(self.car_body)
+
+    def _place_car_body(self):
+        """
+        Puts the car body back at its starting position, angle and velocity
+        """
+        self.car_body.position = self.position[0], self.position[1]
+        self.car_body.angle = self.track.angle_of_cars
+        stop_body(self.car_body)
         driving_direction = Vec2d(1, 0).rotated(self.car_body.angle)
         self.car_body.apply_impulse(driving_direction)
-        self.space.add(self.car_body, self.car_shape)
         self.car_body.vel = VEL_MIN
-        self.car_radar = self._create_radar_sensor(self.car_body)
 
     def _create_radar_sensor(self, car_body: pymunk.Body) -> pymunk.Circle:
         """
@@ -508,23 +624,68 @@ class _Car:
 
     def reset(self):
         """
-        Reset car variables to prepare for another simulation
+        Reset car variables to prepare for another simulation. The pymunk body is reused, but it is taken out of the
+        space and added back: pymunk forgets its contacts (bombs removed while touching the car never call the separate
+        handlers) and calls the begin handlers again, as it would for a new car.
         """
         self.first = True
         self.frame_count = 0
         self.grass_penalty = 0
         self.punctuation = 0
+        self.checkpoints_reached = 0
         self.current_checkpoint = 0
+        self.checkpoint_sensor = 0
+        self.crash_timer = 0
         self.space.remove(self.car_body, self.car_shape, self.car_radar)
-        self._create_new_car_body()
         self.bodies_around = []
         self.crashed = False
+        self.sensors_ready = False
+        self._place_car_body()
+        self.last_position = tuple(self.car_body.position)
+        self.space.add(self.car_body, self.car_shape, self.car_radar)
+
+    def snapshot(self) -> tuple:
+        """
+        :return: the state of the car, see Simulation.snapshot
+        """
+        body = self.car_body
+        position, velocity = body.position, body.velocity
+        # Bias velocities push overlapping shapes apart on the next step, see stop_body
+        body_struct = body._body.contents
+        return ((position.x, position.y, body.angle, velocity.x, velocity.y, body.vel, body_struct.v_bias_private.x,
+                 body_struct.v_bias_private.y, body_struct.w_bias_private),
+                tuple([getattr(self, name) for name in self.SNAPSHOT_ATTRIBUTES]), self.readings.item())
+
+    def restore_body(self, state: tuple) -> None:
+        """
+        Puts the pymunk body of the car back in a state returned by snapshot
+        """
+        x, y, angle, velocity_x, velocity_y, vel, bias_x, bias_y, angular_bias = state[0]
+        body = self.car_body
+        body.position = x, y
+        body.angle = angle
+        body.velocity = velocity_x, velocity_y
+        body.vel = vel
+        body.angular_velocity = 0
+        body_struct = body._body.contents
+        body_struct.v_bias_private.x = bias_x
+        body_struct.v_bias_private.y = bias_y
+        body_struct.w_bias_private = angular_bias
+
+    def restore(self, state: tuple) -> None:
+        """
+        Puts the car back in a state returned by snapshot. The obstacles around the car are left as they are, see
+        Simulation.restore.
+        """
+        self.restore_body(state)
+        for name, value in zip(self.SNAPSHOT_ATTRIBUTES, state[1]):
+            setattr(self, name, value)
+        self.readings_record[0] = state[2]
 
     @property
     def sensors(self) -> list:
-
         """
-        :return: List which contains (in order):
+        :return: List with the readings of the last read_sensors call, which contains (in order):
         track_distance_left: 1-100
         track_distance_center: 1-100
         track_distance_right: 1-100
@@ -536,46 +697,60 @@ class _Car:
         enemy_detected: 0 or 1
         checkpoint: 1 or 0
         """
+        return list(self.readings.item())
 
-        # Default values
-        self.obstacle_distance = -1
-        self.obstacle_body_position_angle = 0
+    def read_sensors(self) -> None:
+        """
+        Reads every sensor of the car into self.readings. Simulations call it once per frame, after the physics step.
+        """
+        readings = self.readings
+        x, y = self.car_body.position
+
+        # The next checkpoint is crossed when the segment the car moved along since the last call touches it: one test
+        # per frame, which can't miss a checkpoint however fast the car goes
+        last_x, last_y = self.last_position
+        self.last_position = (x, y)
+        if segments_intersect(last_x, last_y, x, y, *self.checkpoint_segments[self.current_checkpoint]):
+            self.mark_checkpoint()
 
         # Gets track readings
-        x, y = self.car_body.position
-        readings = self._get_sonar_readings(x, y, self.car_body.angle)
+        sonar = self._get_sonar_readings(x, y, self.car_body.angle)
+        readings['track_distance_left'] = sonar[0]
+        readings['track_distance_center'] = sonar[1]
+        readings['track_distance_right'] = sonar[2]
+        readings['on_track'] = self.on_track
 
         # Gets checkpoint distances
-        checkpoint_distance = distance(self.checkpoints[self.current_checkpoint], self.car_body.position)
-        self.current_checkpoint_distance = checkpoint_distance
+        self.current_checkpoint_distance = kernels.segment_distance(*self.checkpoint_segments[self.current_checkpoint],
+                                                                    x, y)
+        readings['checkpoint_distance'] = self.current_checkpoint_distance
+        readings['car_velocity'] = self.car_body.vel
 
         # Gets Enemy detection sensors
         self.obstacle_distance, self.obstacle_body_position_angle, enemy_detected = self.compute_nearest_body()
-
-        bomb_distance, bomb_position_angle, bomb_detected = self.compute_nearest_bomb()
+        readings['enemy_distance'] = self.obstacle_distance
+        readings['enemy_position_angle'] = self.obstacle_body_position_angle
+        readings['enemy_detected'] = enemy_detected
 
         # Checks checkpoint sensor:
-        if self.checkpoint_sensor == 1:
-            checkpoint = 1
-            self.checkpoint_sensor = 0
-        else:
-            checkpoint = 0
+        readings['checkpoint'] = self.checkpoint_sensor
+        self.checkpoint_sensor = 0
 
-        if self.obs == self.on_track_color:
+        if self.obs == kernels.ROAD:
             incoming_track = 1
-        elif self.obs == self.ice_track_color:
+        elif self.obs == kernels.ICE:
             incoming_track = 2
         else:
             incoming_track = 0
 
         if self.on_track > 0 and incoming_track == 0:
             incoming_track = self.on_track
+        readings['incoming_track'] = incoming_track
 
-        sensors = [readings[0], readings[1], readings[2], int(self.on_track), checkpoint_distance,
-                   self.car_body.vel, self.obstacle_distance, self.obstacle_body_position_angle, enemy_detected,
-                   checkpoint, incoming_track, bomb_detected, bomb_distance, bomb_position_angle]
+        readings['bomb_distance'], readings['bomb_position_angle'], readings['bomb_detected'] = \
+            self.compute_nearest_bomb()
 
-        return sensors
+        self.sensors_ready = True
 
     def _get_sonar_readings(self, x: float, y: float, angle):
         """
@@ -586,120 +761,16 @@ class _Car:
         :return:
         """
 
-        readings = []
-        # Make our arms.
-        arm_left = self.make_sonar_arm(x, y)
-        arm_middle = arm_left
-        arm_right = arm_left
-
-        # Rotate them and get readings.
-        readings.append(self._get_arm_distance(arm_left, x, y, angle, 0.75))
-        readings.append(self._get_arm_distance(arm_middle, x, y, angle, 0, center=True))
-        readings.append(self._get_arm_distance(arm_right, x, y, angle, -0.75))
+        out = kernels.sonar(self.track_classes, x, y, angle, width, height, self.sonar_readings,
+                            self.track_distances)
+        self.obs = int(out[kernels.SONAR_FRONT_CLASS])
 
         if show_simulation:
+            for arm in range(3):
+                self._draw_track_sensor((int(out[4 + 2 * arm]), int(out[5 + 2 * arm])))
             pygame.display.update()
 
-        return readings
-
-    def _get_arm_distance(self, arm: list, x: float, y: float, angle: float, offset: float, center=False) -> int:
-        # Used to count the distance.
-        """
-        Calculates track sensor values
-        :param arm: sonar arm
-        :param x: car x
-        :param y: car y
-        :param angle: car angle
-        :param offset: used for correction
-        :param center: True if this is the central track sensor, false otherwise
-        :return: Distance ranging from 1-100
-        """
-        i = 0
-        rotated_p = self.get_rotated_point(
-            x, y, arm[0][0], arm[0][1], angle + offset
-        )
-
-        if center:
-            self.obs = get_point_from_rgb_list(rotated_p[0], height - rotated_p[1], self.track_rgb)
-
-        # Look at each point and see if we've hit something.
-
-        for point in arm:
-            i += 1
-
-            # Move the point to the right spot.
-            rotated_p = self.get_rotated_point(
-                x, y, point[0], point[1], angle + offset
-            )
-            if i == 1 and center:
-                self.point_in_front = rotated_p
-
-            # Check if we've hit something. Return the current i (distance)
-            # if we did.
-            if rotated_p[0] <= 0 or rotated_p[1] <= 0 \
-                    or rotated_p[0] >= width or rotated_p[1] >= height:
-                self._draw_track_sensor(rotated_p)
-                return i  # Sensor is off the screen.
-            else:
-                obs = get_point_from_rgb_list(rotated_p[0], height - rotated_p[1], self.track_rgb)
-
-                if self.get_track_or_not(obs) != 0:
-                    self._draw_track_sensor(rotated_p)
-                    return i
-                elif center:
-                    self.obs = obs
-
-        self._draw_track_sensor(rotated_p)
-        return i
-
-    @staticmethod
-    def make_sonar_arm(x: float, y: float) -> list:
-        """
-        :return: list of points
-        """
-        spread = 1  # Default spread.
-        arm_distance = 5  # Gap before first sensor.
-        arm_points = []
-        # Make an arm. We build it flat because we'll rotate it about the
-        # center later.
-        for i in range(1, 101):
-            arm_points.append((arm_distance + x + (spread * i), y))
-
-        return arm_points
-
-    @staticmethod
-    def get_rotated_point(x_1: float, y_1: float, x_2: float, y_2: float, radians: float) -> (float, float):
-        """
-        Computes rotated points for sonar arms
-
-        :param x_1: car x
-        :param y_1: car y
-        :param x_2: sonar arm x
-        :param y_2: sonar arm y
-        :param radians: sonar arm angle
-        :return: Point for sonar arm
-        """
-        # Rotate x_2, y_2 around x_1, y_1 by angle.
-        x_change = (x_2 - x_1) * math.cos(radians) + \
-                   (y_2 - y_1) * math.sin(radians)
-        y_change = (y_1 - y_2) * math.cos(radians) - \
-                   (x_1 - x_2) * math.sin(radians)
-        new_x = x_change + x_1
-        new_y = height - (y_change + y_1)
-        return int(new_x), int(new_y)
-
-    def get_track_or_not(self, reading: list) -> int:
-        """
-        Checks if car is in track
-
-        :param reading: A list representing a color
-        :return: 0 or 1 indicating true or false
-        """
-        #if reading != self.on_track_color and reading != self.ice_track_color:
-        if reading != self.ice_track_color and reading != self.on_track_color and reading != (127, 125, 29, 255):
-            return 1
-        else:
-            return 0
+        return out
 
     @property
     def score(self) -> int:
@@ -708,22 +779,19 @@ class _Car:
         """
         return self.punctuation - (10*self.grass_penalty) - self.current_checkpoint_distance
 
-    # noinspection PyUnusedLocal
-    def mark_checkpoint(self, game, attribute):
+    def mark_checkpoint(self):
         """
-        Function called by pymunk's collision handling function witch detects if a car has crossed a checkpoint. This is
-        called when a car starts touching a checkpoint.
+        Rewards the car for crossing its next checkpoint
         """
-        for shape in attribute.shapes:
-            if self.checkpoints[self.current_checkpoint] is shape:
-                self.current_checkpoint += 1
-                self.punctuation += 500
-                self.frame_count = 0
-                self.checkpoint_sensor = 1
+        self.current_checkpoint += 1
+        self.checkpoints_reached += 1
+        self.punctuation += 500
+        self.frame_count = 0
+        self.checkpoint_sensor = 1
         if self.current_checkpoint >= self.max_checkpoints:
             self.current_checkpoint = 0
             for checkpoint in self.checkpoints:
-                checkpoint.color = THECOLORS['yellow']
+                checkpoint.color = COLORS['yellow']
         return True
 
 
@@ -731,10 +799,12 @@ class _Bot(_Car):
     """
     Class to control bot behavior.
     """
+    SNAPSHOT_ATTRIBUTES = _Car.SNAPSHOT_ATTRIBUTES + ('curr', 'steps', 'can_break', 'break_count')
+
     def __init__(self, space, track, position, track_rgb, off_track_color, checkpoints, car_collision_type, bot_type,
-                 img_path, screen=None):
+                 img_path, screen=None, track_classes=None, track_distances=None):
         super().__init__(space, track, position, track_rgb, off_track_color, checkpoints, car_collision_type, img_path,
-                         screen)
+                         screen, track_classes, track_distances)
         self.bot_type = bot_type
         self.curr = 0
         self.steps = 0
@@ -804,7 +874,10 @@ class _Bot(_Car):
         raise NotImplementedError("You must implement custom_bot")
 
     def choose_action(self):
-        sensors = self.sensors
+        # Readings of the end of the previous frame: the bot hasn't moved since
+        if not self.sensors_ready:
+            self.read_sensors()
+        sensors = self.readings
         if self.bot_type == 'dumb_bot':
             return self.dumb_bot(sensors)
         elif self.bot_type == 'safe_bot':
@@ -824,26 +897,30 @@ class _Bot(_Car):
 
 class _ParkedBot(_Car):
     def __init__(self, space, track, position, track_rgb, off_track_color, checkpoints, car_collision_type,
-                 img_path, screen=None):
+                 img_path, screen=None, track_classes=None, track_distances=None):
         """
         A car that does nothing but possibly collide with other cars
         """
         super().__init__(space, track, position, track_rgb, off_track_color, checkpoints, car_collision_type,
-                         img_path,screen)
+                         img_path,screen, track_classes, track_distances)
         pass
 
     def _create_new_car_body(self):
         rectangle = [(-20, -10), (-20, 10), (20, 10), (20, -10)]
         self.car_body = pymunk.Body(100, pymunk.inf)
-        self.car_body.position = self.position[0][0], self.position[0][1]
         self.car_shape = CarShape(self.car_body, rectangle, self)
-        self.car_shape.color = THECOLORS["green"]
+        self.car_shape.color = COLORS["green"]
         self.car_shape.elasticity = 1.0
-        self.car_body.angle = self.position[1]
         self.car_shape.collision_type = CAR_COLLISION_TYPE
+        self._place_car_body()
+        self.space.add(self.car_body, self.car_shape)
+
+    def _place_car_body(self):
+        self.car_body.position = self.position[0][0], self.position[0][1]
+        self.car_body.angle = self.position[1]
+        stop_body(self.car_body)
         driving_direction = Vec2d(1, 0).rotated(self.car_body.angle)
         self.car_body.apply_impulse(driving_direction)
-        self.space.add(self.car_body, self.car_shape)
         self.car_body.vel = INIT_VELOCITY
 
     def car_step(self, action):
@@ -852,57 +929,79 @@ class _ParkedBot(_Car):
     def reset(self):
         self.punctuation = 0
         self.current_checkpoint = 0
-        self.space.remove(self.car_body, self.car_shape)
-        self._create_new_car_body()
-        self.bodies_around = []
+        self._place_car_body()
 
 
 class _Bomb(_Car):
+    SNAPSHOT_ATTRIBUTES = ('active', 'exploded', 'explosion_effect_counter', 'explosion_effect', 'crashed',
+                           'sprite_path')
+
     def __init__(self, space, track, position, track_rgb, off_track_color, checkpoints, car_collision_type,
-                 img_path, screen=None):
+                 img_path, screen=None, track_classes=None, track_distances=None):
         """
         A bomb, I'm reusing the car code because I'm lazy
+
+        Bombs are pooled: one is created per bomb position of the track and only the ones drawn for a race are added
+        to the space (see activate/deactivate).
         """
 
         self.exploded = False
         self.explosion_effect_counter = 10
         self.explosion_effect = True
+        self.active = False
 
         super().__init__(space, track, position, track_rgb, off_track_color, checkpoints, car_collision_type,
-                         img_path, screen)
+                         img_path, screen, track_classes, track_distances)
 
     def _create_new_car_body(self):
         """
-
+        Creates the bomb body without adding it to the space
         """
         self.car_body = pymunk.Body(100, pymunk.inf)
-        self.car_body.position = self.position[0][0], self.position[0][1]
         self.car_shape = BombShape(self.car_body, 20, self)
-        self.car_shape.color = THECOLORS["black"]
+        self.car_shape.color = COLORS["black"]
         self.car_shape.ignore_draw = True
-        self.car_body.angle = self.position[1]
         self.car_shape.collision_type = BOMB_COLLISION_TYPE
+        self._place_car_body()
+
+    def _place_car_body(self):
+        self.car_body.position = self.position[0][0], self.position[0][1]
+        self.car_body.angle = self.position[1]
+        stop_body(self.car_body)
         driving_direction = Vec2d(1, 0).rotated(self.car_body.angle)
         self.car_body.apply_impulse(driving_direction)
-        self.space.add(self.car_body, self.car_shape)
         self.car_body.vel = INIT_VELOCITY
 
+    def activate(self):
+        """
+        Arms the bomb and adds it to the space, if it is not there yet
+        """
+        self.exploded = False
+        self.explosion_effect_counter = 10
+        self.explosion_effect = True
+        self.crashed = False
+        self.sprite_path = self.img_path
+        self._place_car_body()
+        if not self.active:
+            self.space.add(self.car_body, self.car_shape)
+            self.active = True
+
+    def deactivate(self):
+        """
+        Removes the bomb from the space, if it is there
+        """
+        if self.active:
+            self.space.remove(self.car_body, self.car_shape)
+            self.active = False
+
     def car_step(self, action: int):
-        if self.crashed:
-            self.car_img_shape = explosion_shape
-            try:
-                self.space.remove(self.car_body)
-                self.space.remove(self.car_shape)
-                self.exploded = True
-            except KeyError:
-                pass
+        if self.crashed and self.active:
+            self.sprite_path = explosion_image
+            self.deactivate()
+            self.exploded = True
 
     def reset(self):
-        try:
-            self.space.remove(self.car_body)
-            self.space.remove(self.car_shape)
-        except KeyError:
-            pass
+        self.deactivate()
 
     def draw(self):
         """
@@ -914,7 +1013,7 @@ class _Bomb(_Car):
             p = Vec2d(p.x, height - p.y)
 
             # Transform image to right size and flips it
-            new_img = pygame.transform.scale(self.car_img_shape, (38, 38))
+            new_img = pygame.transform.scale(load_image(self.sprite_path), (38, 38))
             new_img = pygame.transform.flip(new_img, True, False)
 
             # Rotates image and place it at cars position
@@ -933,18 +1032,39 @@ class _Bomb(_Car):
             self.screen.blit(new_img, p)
 
 
+class SimulationSnapshot:
+    """
+    State of a simulation between two frames, see Simulation.snapshot
+    """
+    __slots__ = ('frame_count', 'cars', 'bomb_indices', 'bombs')
+
+    def __init__(self, frame_count: int, cars: tuple, bomb_indices: tuple, bombs: tuple):
+        """
+        :param frame_count: frame count of the simulation
+        :param cars: state of the player's car and of the bot, if any (see _Car.snapshot)
+        :param bomb_indices: positions in the bomb pool of the bombs drawn for the race
+        :param bombs: state of each of these bombs
+        """
+        self.frame_count = frame_count
+        self.cars = cars
+        self.bomb_indices = bomb_indices
+        self.bombs = bombs
+
+
 class Simulation:
-    def __init__(self, track, bot_type, csv_file_name):
+    def __init__(self, track, bot_type, csv_file_name=("learning_progress",)):
         """
         Handles simulation and GUI
         :param track: Track object witch configures the scenario
         :param bot_type: Type of bot to be alongside user, can be set to None for no bot
+        :param csv_file_name: one element sequence with the name of the .csv file where learn() saves its progress
         """
 
         self.csvpath = "./results/"+csv_file_name[0]+".csv"
 
         # Initialize GUI if requested
         if show_simulation:
+            import_pygame()
             pygame.init()
             self.screen = pygame.display.set_mode((width, height))
             self.clock = pygame.time.Clock()
@@ -959,7 +1079,7 @@ class Simulation:
         self.on_track = True
         self.bot_type = bot_type
 
-        self.global_track = Background(self.track.display_img_path, [0, 0])
+        self.global_track = Background(self.track.display_img_path, [0, 0]) if show_simulation else None
         self.crashed_single_time = False
         self.max_steps = 3000
         self.crashed = False
@@ -970,6 +1090,7 @@ class Simulation:
         # Physics stuff.
         self.space = pymunk.Space()
         self.space.gravity = pymunk.Vec2d(0., 0.)
+        add_collision_handlers(self.space)
 
         self.checkpoints = []
 
@@ -980,15 +1101,16 @@ class Simulation:
 
         # More GUI stuff
         if show_simulation:
-            self.screen.fill(THECOLORS["black"])
+            self.screen.fill(COLORS["black"])
             self.screen.blit(self.global_track.image, self.global_track.rect)
             draw(self.screen)
             pygame.display.flip()
 
-        # Track variables
-        self.image = Image.open(self.track.mask_img_path)
-        self.image = self.image.resize((width, height))
-        self.track_rgb = list(self.image.getdata())
+        # Track variables, see trackcache
+        track_data = trackcache.load_or_build(self.track, width, height)
+        self.track_rgb = None
+        self.track_classes = track_data.classes
+        self.track_distances = track_data.distances
         self.off_track_color = (84, 174, 50, 255)
         self.on_track_color = (163, 123, 75, 255)
         self.ice_track_color = (13, 193, 217, 255)
@@ -1008,26 +1130,27 @@ class Simulation:
 
         # Creates player car
         self.car1 = _Car(self.space, self.track, self.track.car1_position, self.track_rgb, self.off_track_color,
-                         self.checkpoints, 1000, car_image, screen=game_screen)
+                         self.checkpoints, 1000, car_image, screen=game_screen, track_classes=self.track_classes,
+                         track_distances=self.track_distances)
 
-        # Get sample of 4 random bombs positions
-        random_bombs_position = random.sample(self.track.bombs, 4)
-
-        for i in range(0, len(random_bombs_position)):
-            self.bombs.append(
-                _Bomb(self.space, self.track, random_bombs_position[i], self.track_rgb,
-                      self.off_track_color,
-                      self.checkpoints, 1001, bomb_image, screen=game_screen))
+        # One bomb per possible position, 4 of them are drawn for each race
+        self.bomb_pool = [_Bomb(self.space, self.track, position, self.track_rgb, self.off_track_color,
+                                self.checkpoints, 1001, bomb_image, screen=game_screen,
+                                track_classes=self.track_classes, track_distances=self.track_distances)
+                          for position in self.track.bombs]
+        self._arm_bombs()
 
         # Initialize bots
         if bot_type is not None:
             if bot_type == 'player2':
                 self.car_bot = _Car(self.space, self.track, self.track.car2_position, self.track_rgb, self.off_track_color,
-                         self.checkpoints, 1000, bot_image, screen=game_screen)
+                         self.checkpoints, 1000, bot_image, screen=game_screen, track_classes=self.track_classes,
+                         track_distances=self.track_distances)
             else:
                 self.car_bot = _Bot(self.space, self.track, self.track.car2_position,
                                     self.track_rgb, self.off_track_color,
-                                    self.checkpoints, 1000, bot_type, bot_image, screen=game_screen)
+                                    self.checkpoints, 1000, bot_type, bot_image, screen=game_screen,
+                                    track_classes=self.track_classes, track_distances=self.track_distances)
 
         self.game_objects = [i for i in self.bombs]
         self.game_objects.append(self.car1)
@@ -1036,54 +1159,172 @@ class Simulation:
         if bot_type is not None and bot_type != 'parked_bots':
             self.game_objects.append(self.car_bot)
 
-    def learn(self, controller: Controller, number_of_episodes: int) -> None:
-
-        episode_count = 0
-        best_score = float('-inf')
-        while episode_count < number_of_episodes:
-            self.reset()
+    def learn(self, controller: Controller, number_of_episodes: int, curriculum=None, checkpoint=None,
+              resumed: dict = None, budget=None) -> None:
+        """
+        Trains a controller, saving its table whenever it beats its best score and once done, which is as soon as the
+        controller has converged (see Controller.converged) if it converges before number_of_episodes
 
-            # Initial step
-            sensors = self.frame_step(5)
+        :param controller: controller being trained
+        :param number_of_episodes: number of learning races, None to learn until the time budget runs out
+        :param curriculum: a curriculum.Curriculum picking the track of each race, None to race on this simulation's
+                           track only. Best scores are then tracked per track.
+        :param checkpoint: a checkpoint.Checkpoint saving the training state (see training_state) regularly and once
+                           done. If the run is interrupted, learn saves a checkpoint and returns at the end of the
+                           current episode, without its final save.
+        :param resumed: training state to go on from; controller and curriculum must be the ones it holds
+        :param budget: a budget.TimeBudget; learning stops early enough for the final saves to end within it. Progress
+                       is then printed about every budget.LOG_INTERVAL seconds rather than every episode.
+        """
+        if number_of_episodes is None and budget is None:
+            raise ValueError("learning needs a number of episodes or a time budget")
+        if curriculum is not None:
+            curriculum.use(self)
 
-            new_state = State(sensors)
-            old_state = State(sensors)
+        episode_count = 0
+        best_scores = {}
+        if resumed is not None:
+            episode_count = resumed['episode_count']
+            best_scores = resumed['best_scores']
+            random.setstate(resumed['random_state'])
+            np.random.set_state(resumed['numpy_random_state'])
+            self.truncate_learning_progress(resumed['csv_size'])
+
+        def timed_save(kind, save, *args):
+            start = time.perf_counter()
+            save(*args)
+            if budget is not None:
+                budget.record_save(kind, time.perf_counter() - start)
+
+        def save_checkpoint():
+            timed_save('checkpoint', checkpoint.write, self.training_state(
+                controller, episode_count, number_of_episodes, best_scores, curriculum, budget))
+            if budget is not None:
+                checkpoint.interval = budget.checkpoint_interval(requested_interval)
+
+        if checkpoint is not None:
+            requested_interval = checkpoint.interval
+            if budget is not None:
+                # Also measures how long the final checkpoint will take
+                save_checkpoint()
+
+        with checkpoint.catching_signals() if checkpoint is not None else contextlib.nullcontext():
+            while number_of_episodes is None or episode_count < number_of_episodes:
+                if budget is not None and not budget.allows_episode():
+                    print("time budget spent after", episode_count, "episodes")
+                    break
+
+                # Curricula plan their schedule over the number of episodes the budget is expected to allow
+                planned = number_of_episodes if number_of_episodes is not None else \
+                    episode_count + 1 + budget.episodes_left()
+                if curriculum is None:
+                    simulation = self
+                else:
+                    simulation = curriculum.simulation(curriculum.choose_track(episode_count, planned))
+                start = time.perf_counter()
+                score = simulation.run_episode(controller, episode_count)
+                if budget is not None:
+                    budget.record_episode(time.perf_counter() - start)
+
+                if curriculum is not None:
+                    curriculum.record(simulation.track, score)
+                if budget is None:
+                    if curriculum is None:
+                        print("episode",episode_count,"score",score)
+                    else:
+                        print("episode", episode_count, "track", simulation.track.name, "score", score)
+                elif episode_count % budget.log_period() == 0:
+                    print("episode", episode_count, "track", simulation.track.name, "score", score,
+                          "episodes/s %.1f" % (1 / budget.episode_duration), "time left %.0f s" % budget.remaining)
+                self.save_learning_progress(controller, episode_count, score)
+                if score >= best_scores.get(simulation.track.name, float('-inf')):
+                    best_scores[simulation.track.name] = score
+                    output = "./params/%s_%d.txt" % (
+                        datetime.datetime.fromtimestamp(time.time()).strftime('%Y%m%d%H%M%S'), episode_count)
+                    timed_save('table', controller.q_table.save, output)
+
+                episode_count += 1
+                if controller.converged():
+                    print("converged after", episode_count, "episodes")
+                    break
+                if checkpoint is not None and checkpoint.due():
+                    save_checkpoint()
+                    if checkpoint.stop_requested:
+                        print("stopped after", episode_count, "episodes, checkpoint saved to", checkpoint.path)
+                        return
+
+            output = "./params/%s_final.txt" % datetime.datetime.fromtimestamp(time.time()).strftime('%Y%m%d%H%M%S')
+            controller.q_table.save(output)
+            if checkpoint is not None:
+                save_checkpoint()
+
+    def training_state(self, controller: Controller, episode_count: int, number_of_episodes: int, best_scores: dict,
+                       curriculum=None, budget=None) -> dict:
+        """
+        :return: everything learn needs to go on from the end of the current episode (see checkpoint), including the
+                 seconds left of the time budget, if any
+        """
+        return {'track_name': self.track.name, 'bot_type': self.bot_type, 'csvpath': self.csvpath,
+                'controller': controller, 'curriculum': curriculum, 'episode_count': episode_count,
+                'number_of_episodes': number_of_episodes,
+                'time_left': None if budget is None else max(0.0, budget.remaining),
+                'best_scores': best_scores, 'random_state': random.getstate(),
+                'numpy_random_state': np.random.get_state(),
+                'csv_size': os.path.getsize(self.csvpath) if os.path.isfile(self.csvpath) else 0}
+
+    def truncate_learning_progress(self, size: int) -> None:
+        """
+        Drops the learning progress written after a checkpoint, which a resumed run writes again
+        """
+        if not os.path.isfile(self.csvpath):
+            return
+        if size == 0:
+            os.remove(self.csvpath)
+        elif os.path.getsize(self.csvpath) > size:
+            os.truncate(self.csvpath, size)
+
+    def run_episode(self, controller: Controller, episode_count: int) -> float:
+        """
+        Runs a single learning race
+        :param controller: controller being trained
+        :param episode_count: number of the episode, given to the controller's exploration policy
+        :return: score of the player's car at the end of the race
+        """
+        self.reset()
+        controller.start_episode()
+
+        # Initial step
+        sensors = self.frame_step(5)
 
-            frame_number = 0
-            start = True
-            while frame_number <= self.track.episode_length:
-                action = controller.take_action(new_state, episode_count)
-                sensors = self.frame_step(action)
-                old_state = new_state
-                new_state = State(sensors)
+        new_state = controller.make_state(sensors)
 
-                reward = controller.compute_reward(new_state, old_state, action, frame_number, False)
-                controller.update_q(new_state, old_state, action, reward, False)
+        frame_number = 0
+        while frame_number <= self.track.episode_length:
+            action = controller.take_action(new_state, episode_count)
+            sensors = self.frame_step(action)
+            old_state = new_state
+            new_state = controller.make_state(sensors, old_state)
 
-                frame_number += 1
+            reward = controller.compute_reward(new_state, old_state, action, frame_number, False)
+            controller.update_q(new_state, old_state, action, reward, False)
 
-            print("episode",episode_count,"score",self.car1.score)
-            self.save_learning_progress(controller, episode_count)
-            if self.car1.score >= best_score:
-                best_score = self.car1.score
-                output = "./params/%s_%d.txt" % (datetime.datetime.fromtimestamp(time.time()).strftime('%Y%m%d%H%M%S'),
-                                                 episode_count)
-                controller.q_table.save(output)
+            frame_number += 1
 
-            episode_count += 1
+        controller.end_episode()
+        return self.car1.score
 
-        output = "./params/%s_final.txt" % datetime.datetime.fromtimestamp(time.time()).strftime('%Y%m%d%H%M%S')
-        controller.q_table.save(output)
+    def save_learning_progress(self, controller, episode_count, score=None):
+        if score is None:
+            score = self.car1.score
 
-        pass
-    
+        def setting(name):
+            # Controllers other than controller1 may not have every exploration setting: theirs are left empty
+            return getattr(controller, name, '')
 
-    def save_learning_progress(self, controller, episode_count):
-        
         if os.path.isfile(self.csvpath):
             
-            row = [episode_count, self.car1.score,
-                    controller.eps, controller.temperature]
+            row = [episode_count, score,
+                    setting('eps'), setting('temperature')]
 
             with open(self.csvpath, "a", newline='') as csv_file:
                 writer = csv.writer(csv_file, delimiter=',')
@@ -1091,53 +1332,64 @@ class Simulation:
         else:
             first_row = ["episode", "score",
                         "eps", "temperature",
-                        "strategy = "+str(controller.strategy),
-                        "alpha = "+str(controller.alpha), 
-                        "atten = "+str(controller.atten)]
+                        "strategy = "+str(setting('strategy')),
+                        "alpha = "+str(setting('alpha')), 
+                        "atten = "+str(setting('atten'))]
 
-            second_row = [episode_count, self.car1.score,
-                          controller.eps, controller.temperature]
+            second_row = [episode_count, score,
+                          setting('eps'), setting('temperature')]
 
             with open(self.csvpath, "w", newline='') as csv_file:
                 writer = csv.writer(csv_file, delimiter=',')
                 writer.writerows([first_row, second_row])
 
 
-    def evaluate(self, controller: Controller) -> None:
+    def evaluate(self, controller: Controller) -> float:
+        """
+        Runs a single race where the controller only exploits what it has learned
+        :param controller: controller being evaluated
+        :return: score of the player's car at the end of the race
+        """
+        self.reset()
+        controller.freeze()
+        controller.attach(self, self.car1)
+
         frame_number = 0
         sensors = self.frame_step(5)
         while frame_number <= self.track.episode_length:
-            state = State(sensors)
-            q_values = [controller.q_table.get_q_value(state, i) for i in (1, 2, 3, 4, 5)]
-            action = q_values.index(max(q_values)) + 1
+            action, = controller.act([sensors])
             sensors = self.frame_step(action)
-        pass
+            frame_number += 1
+
+        return self.car1.score
 
     def evaluate_comp(self, player_1: Controller, player_2: Controller) -> None:
+        player_1.freeze()
+        player_2.freeze()
+        player_1.attach(self, self.car1)
+        player_2.attach(self, self.car_bot)
         frame_number = 0
         self.car1.car_step(5)
         self.car_bot.car_step(5)
 
+        self.car1.read_sensors()
+        self.car_bot.read_sensors()
         sensors_player_1 = self.car1.sensors
         sensors_player_2 = self.car_bot.sensors
 
         self.comp_frame_step()
 
         while frame_number <= self.track.episode_length:
-            state_1 = State(sensors_player_1)
-            state_2 = State2(sensors_player_2)
-
-            q_values_1 = [player_1.q_table.get_q_value(state_1, i) for i in _Car.ACTION_LIST]
-            q_values_2 = [player_2.q_table.get_q_value(state_2, i) for i in _Car.ACTION_LIST]
-
-            action_1 = q_values_1.index(max(q_values_1)) + 1
-            action_2 = q_values_2.index(max(q_values_2)) + 1
+            action_1, = player_1.act([sensors_player_1])
+            action_2, = player_2.act([sensors_player_2])
 
             self.car1.car_step(action_1)
             self.car_bot.car_step(action_2)
 
             self.comp_frame_step()
 
+            self.car1.read_sensors()
+            self.car_bot.read_sensors()
             sensors_player_1 = self.car1.sensors
             sensors_player_2 = self.car_bot.sensors
 
@@ -1146,7 +1398,8 @@ class Simulation:
 
     def _create_checkpoint(self, pair_of_points: ((float, float), (float, float)), color='yellow')-> pymunk.Poly:
         """
-        Create checkpoint sensor
+        Create checkpoint shape. Cars detect checkpoints themselves (see _Car.read_sensors): the shape is only added to
+        the space, where pymunk draws it, when the simulation is rendered.
         :param pair_of_points: Coordinates of checkpoint segment
         :param color: Color of checkpoint
         :return: checkpoint shape
@@ -1156,9 +1409,10 @@ class Simulation:
         c_shape = pymunk.Poly(c_body, pair_of_points)
         c_shape.sensor = True
         c_shape.elasticity = 100
-        c_shape.color = THECOLORS[color]
+        c_shape.color = COLORS[color]
         c_shape.collision_type = CHECKPOINT_COLLISION_TYPE
-        self.space.add(c_body, c_shape)
+        if show_simulation:
+            self.space.add(c_body, c_shape)
         return c_shape
 
     def reset(self):
@@ -1168,24 +1422,73 @@ class Simulation:
         self.car1.reset()
         if self.bot_type is not None and self.bot_type != 'parked_bots':
             self.car_bot.reset()
-        for bomb in self.bombs:
-            bomb.reset()
+        self._arm_bombs()
 
-        # GUI stuff
-        if show_simulation:
-            game_screen = self.screen
-        else:
-            game_screen = None
+    def _cars(self) -> list:
+        """
+        :return: the cars of the simulation, player's car first
+        """
+        if self.bot_type is not None:
+            return [self.car1, self.car_bot]
+        return [self.car1]
 
-        random_bombs_position = random.sample(self.track.bombs, 4)
-        self.bombs = []
-        for i in range(0, len(random_bombs_position)):
-            self.bombs.append(
-                _Bomb(self.space, self.track, random_bombs_position[i], self.track_rgb,
-                      self.off_track_color,
-                      self.checkpoints, 1001, bot_image, screen=game_screen))
+    def snapshot(self) -> SimulationSnapshot:
+        """
+        Saves the state of the race (cars, bombs and checkpoint progress), to go back to it with restore. Lookahead
+        controllers use it to try actions before taking one. Snapshots must be taken between two frames.
 
-            # self.car_bot.reset()
+        The random generators are not part of the snapshot: dumb bots and the bombs drawn by the next reset won't
+        replay the same way after a restore.
+        """
+        bomb_pool = self.bomb_pool
+        return SimulationSnapshot(self.frame_count, tuple([car.snapshot() for car in self._cars()]),
+                                  tuple([bomb_pool.index(bomb) for bomb in self.bombs]),
+                                  tuple([bomb.snapshot() for bomb in self.bombs]))
+
+    def restore(self, snap: SimulationSnapshot) -> None:
+        """
+        Puts the race back in the state saved by snapshot.
+
+        The cars and bombs are taken out of the space and added back, as in reset, and a very short step finds their
+        contacts right away: the begin handlers rebuild the obstacles around each car, and contacts which end later on
+        call their separate handlers as they would have. The contacts start over though, so pymunk's collision response
+        of cars which were touching may differ slightly from the race the snapshot was taken in.
+        """
+        cars = self._cars()
+        space = self.space
+        for car in cars:
+            space.remove(car.car_body, car.car_shape, car.car_radar)
+        for bomb in self.bombs:
+            bomb.deactivate()
+
+        self.bombs = [self.bomb_pool[index] for index in snap.bomb_indices]
+        for bomb, state in zip(self.bombs, snap.bombs):
+            bomb.restore(state)
+            if bomb.active:
+                space.add(bomb.car_body, bomb.car_shape)
+        for car, state in zip(cars, snap.cars):
+            car.restore_body(state)
+            car.bodies_around = []
+            space.add(car.car_body, car.car_shape, car.car_radar)
+
+        space.step(CONTACT_STEP)
+        # The step moved the bodies a tiny bit and the begin handlers marked touching cars as crashed
+        for bomb, state in zip(self.bombs, snap.bombs):
+            bomb.restore(state)
+        for car, state in zip(cars, snap.cars):
+            car.restore(state)
+        self.frame_count = snap.frame_count
+
+    def _arm_bombs(self):
+        """
+        Picks 4 random bombs from the pool and arms them, disarming the others
+        """
+        self.bombs = random.sample(self.bomb_pool, 4)
+        for bomb in self.bomb_pool:
+            if bomb in self.bombs:
+                bomb.activate()
+            else:
+                bomb.deactivate()
 
     def frame_step(self, action: int) -> list:
         """
@@ -1209,12 +1512,36 @@ class Simulation:
             block_print()
             self._draw_screen()
             enable_print()
-        sensors = self.car1.sensors
+        self.car1.read_sensors()
         if self.bot_type is not None and self.bot_type != 'parked_bots':
-            # noinspection PyStatementEffect
-            self.car_bot.sensors
+            self.car_bot.read_sensors()
+
+        return self.car1.sensors
 
-        return sensors
+    def lookahead_step(self, car: _Car, action: int) -> list:
+        """
+        Advances the simulation by one frame for a planning controller, which then goes back with restore: the given car
+        takes the action, the other car keeps its course (a bot still chooses its own action) and nothing is rendered.
+        :param car: car driven by the planning controller
+        :param action: action of that car
+        :return: sensors the car acquired by advancing frame.
+        """
+        global show_simulation
+        shown, show_simulation = show_simulation, False
+        try:
+            self.frame_count += 1
+            cars = self._cars() if self.bot_type != 'parked_bots' else [self.car1]
+            for other in cars:
+                other.car_step(action if other is car else 0)
+            for parked_car in self.bombs:
+                parked_car.car_step(0)
+            self.space.step(1. / 10)
+            for other in cars:
+                other.read_sensors()
+        finally:
+            show_simulation = shown
+
+        return car.sensors
 
     def comp_frame_step(self):
 
@@ -1229,7 +1556,7 @@ class Simulation:
         pass
 
     def _draw_screen(self):
-        self.screen.fill(THECOLORS["black"])
+        self.screen.fill(COLORS["black"])
         self.screen.blit(self.global_track.image, self.global_track.rect)
         self.car1.draw()
         if self.bot_type is not None and self.bot_type != 'parked_bots':
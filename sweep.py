@@ -0,0 +1,348 @@
+"""
+This module searches for good learning options: every trial trains a new table with its own options, trials are spread
+over a pool of headless worker processes, and the outcome of every trial ends up in a single results table.
+
+Search spaces are given as NAME=VALUES, where NAME is one of PARAMETERS and VALUES either a comma separated list of
+values or, for numeric options, a LOW:HIGH range:
+
+    alpha=0.1,0.3,0.5       the listed values
+    myopia=0.8:0.99         any value between 0.8 and 0.99 (random search only)
+
+A grid search runs every combination of the listed values, a random search runs a given number of trials, drawing each
+option uniformly among its values or in its range.
+
+Unpromising trials can be stopped early with successive halving (see SuccessiveHalving), giving their workers to the
+trials that learn best.
+
+Workers keep one Simulation per track for all the trials they run, and tracks baked by prepare-tracks are memory-mapped,
+so every worker shares the same decoded track in memory.
+
+Example:
+    To try 3 learning rates with each strategy, 200 episodes per trial:
+
+        $ python AIRacers.py -e 200 sweep alpha=0.1,0.3,0.5 strategy=epsilon,boltzmann
+
+    To try 50 random options, only keeping the best third of the trials after 20, 60 and 180 episodes:
+
+        $ python AIRacers.py -e 500 sweep myopia=0.8:0.99 alpha=0.05:0.9 --trials 50 --halving 20
+"""
+import csv
+import datetime
+import itertools
+import multiprocessing
+import random
+import statistics
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+import curriculum
+import evaluation
+import registry
+import simulator
+import tracks_config as track
+
+# Command line name -> (controller option, type)
+PARAMETERS = {
+    'myopia': ('atten', float),
+    'alpha': ('alpha', float),
+    'initial-temp': ('init_temp', float),
+    'strategy': ('strategy', str),
+    'trace-decay': ('trace_decay', float),
+    'alpha-visits': ('alpha_visits', int),
+}
+
+# Number of final learning episodes averaged to sum up how a trial ended
+FINAL_WINDOW = 10
+
+
+def parse_space(specs: list) -> dict:
+    """
+    :param specs: NAME=VALUES strings, see the module documentation
+    :return: controller option -> list of values, or (low, high) tuple for ranges
+    """
+    space = {}
+    for spec in specs:
+        name, separator, values = spec.partition('=')
+        if not separator or name not in PARAMETERS:
+            raise ValueError("Invalid search space %r: expected NAME=VALUES with NAME in %s"
+                             % (spec, ', '.join(PARAMETERS)))
+        option, kind = PARAMETERS[name]
+        if ':' in values:
+            if kind is str:
+                raise ValueError("%s takes a list of values, not a range" % name)
+            low, high = values.split(':')
+            space[option] = (kind(low), kind(high))
+        else:
+            space[option] = [kind(value) for value in values.split(',')]
+    return space
+
+
+def grid(space: dict) -> list:
+    """
+    :return: the options of every combination of the values of space
+    """
+    if any(isinstance(values, tuple) for values in space.values()):
+        raise ValueError("Ranges can only be used by random searches (see --trials)")
+    return [dict(zip(space, values)) for values in itertools.product(*space.values())]
+
+
+def sample(space: dict, number_of_trials: int, rng: random.Random) -> list:
+    """
+    :return: the options of number_of_trials random trials
+    """
+    def draw(values):
+        if isinstance(values, tuple):
+            low, high = values
+            return rng.randint(low, high) if isinstance(low, int) else rng.uniform(low, high)
+        return rng.choice(values)
+
+    return [{option: draw(values) for option, values in space.items()} for _ in range(number_of_trials)]
+
+
+class Trial:
+    def __init__(self, number: int, options: dict, table_path: str):
+        """
+        A set of learning options being tried. Between runs, a trial also carries the state of its training (controller,
+        curriculum and random generators), so that it can be resumed in any worker process.
+
+        :param options: learning options of the trial, the ones of the search space only
+        :param table_path: where the learned table is saved once the trial is over
+        """
+        self.number = number
+        self.options = options
+        self.table_path = table_path
+        # Score of every learning episode so far
+        self.scores = []
+        # Number of frames simulated and time spent learning so far
+        self.frames = 0
+        self.seconds = 0.0
+        # Mean score of the learned table, without exploration, over the tracks it learned on; None until it is over
+        self.evaluation_score = None
+        self.controller = None
+        self.schedule = None
+        self.random_state = None
+
+    @property
+    def final_score(self) -> float:
+        """
+        :return: mean score of the last FINAL_WINDOW learning episodes
+        """
+        return statistics.mean(self.scores[-FINAL_WINDOW:])
+
+    @property
+    def episodes_per_second(self) -> float:
+        return len(self.scores) / self.seconds
+
+    @property
+    def frames_per_second(self) -> float:
+        return self.frames / self.seconds
+
+
+def run_trial(job: tuple) -> Trial:
+    """
+    Trains a trial in the current process up to a number of episodes, reusing the simulations of previous trials. Once
+    the trial reaches its last episode, its table is saved and evaluated, and its training state dropped.
+
+    :param job: (trial, number of episodes to reach, other controller options, controller name, track name, bot type,
+                 curriculum name, total number of episodes, seed)
+    :return: the trial, as it is after this run
+    """
+    (trial, episodes, base_options, controller_name, track_name, bot_type, curriculum_name, number_of_episodes,
+     seed) = job
+    if trial.random_state is not None:
+        random.setstate(trial.random_state[0])
+        np.random.set_state(trial.random_state[1])
+    elif seed is not None:
+        random.seed(seed + trial.number)
+        np.random.seed(seed + trial.number)
+
+    if trial.controller is None:
+        trial.controller = registry.create(controller_name, None, **dict(base_options, **trial.options))
+        if curriculum_name is not None:
+            trial.schedule = curriculum.create(curriculum_name, track.track.track_list, bot_type)
+    if trial.schedule is not None:
+        for a_track in trial.schedule.tracks:
+            trial.schedule.use(evaluation.simulation(a_track.name, bot_type))
+
+    start = time.perf_counter()
+    while len(trial.scores) < episodes:
+        if trial.schedule is None:
+            simulation = evaluation.simulation(track_name, bot_type)
+        else:
+            simulation = trial.schedule.simulation(trial.schedule.choose_track(len(trial.scores), number_of_episodes))
+        trial.scores.append(simulation.run_episode(trial.controller, len(trial.scores)))
+        trial.frames += simulation.track.episode_length + 1
+        if trial.schedule is not None:
+            trial.schedule.record(simulation.track, trial.scores[-1])
+    trial.seconds += time.perf_counter() - start
+
+    if len(trial.scores) >= number_of_episodes:
+        trial.controller.q_table.save(trial.table_path)
+        raced = [track_name] if trial.schedule is None else [a_track.name for a_track in trial.schedule.tracks]
+        trial.evaluation_score = statistics.mean(evaluation.simulation(raced_name, bot_type).evaluate(
+            registry.create(controller_name, trial.table_path)) for raced_name in raced)
+        trial.controller = trial.schedule = trial.random_state = None
+    else:
+        trial.random_state = (random.getstate(), np.random.get_state())
+    return trial
+
+
+class SuccessiveHalving:
+    def __init__(self, trials: list, number_of_episodes: int, min_episodes: int = None, eta: int = 3):
+        """
+        Asynchronous successive halving: trials learn rung by rung, rung k ending after min_episodes * eta^k episodes,
+        and the last one after number_of_episodes. A trial reaching a rung only goes on if its rolling score (see
+        Trial.final_score) is among the best 1 / eta of the trials which reached that rung so far; otherwise it is
+        paused, and it may still be resumed later if the next trials do worse. Workers never wait for a rung to fill
+        up: when no paused trial deserves to go on, the next trial starts. Trials still paused once every trial has
+        started and none can go on are stopped for good.
+
+        :param trials: trials to run, started in this order
+        :param min_episodes: episodes of the first rung; None to run every trial to the end in a single go
+        :param eta: reduction factor, only 1 / eta of the trials of each rung go on to the next one
+        """
+        if eta < 2:
+            raise ValueError("The reduction factor of successive halving must be at least 2")
+        self.rungs = []
+        if min_episodes is not None:
+            episodes = max(1, min_episodes)
+            while episodes < number_of_episodes:
+                self.rungs.append(episodes)
+                episodes *= eta
+        self.rungs.append(number_of_episodes)
+        self.eta = eta
+        self.pending = list(trials)
+        # Rolling scores of the trials which reached each rung (but the last), by trial number
+        self.rung_scores = [{} for _ in self.rungs[:-1]]
+        # Trials waiting at a rung for a promotion, by trial number
+        self.paused = {}
+        self.finished = []
+
+    def next_run(self) -> (Trial, int):
+        """
+        :return: the next trial to run and the number of episodes it has to reach, None if no trial can run for now
+        """
+        # Deeper rungs first, so that promising trials end as soon as possible
+        for rung in reversed(range(len(self.rung_scores))):
+            scores = self.rung_scores[rung]
+            # Once every trial has started, rounding up makes sure at least the best trial of each rung goes on
+            kept = len(scores) // self.eta if self.pending else -(-len(scores) // self.eta)
+            best = sorted(scores, key=scores.get, reverse=True)[:kept]
+            for number in best:
+                if number in self.paused and len(self.paused[number].scores) == self.rungs[rung]:
+                    return self.paused.pop(number), self.rungs[rung + 1]
+        if self.pending:
+            return self.pending.pop(0), self.rungs[0]
+        return None
+
+    def update(self, trial: Trial) -> None:
+        """
+        Records a trial back from a run.
+        """
+        if trial.evaluation_score is not None:
+            self.finished.append(trial)
+        else:
+            self.rung_scores[self.rungs.index(len(trial.scores))][trial.number] = trial.final_score
+            self.paused[trial.number] = trial
+
+    def stopped(self) -> list:
+        """
+        :return: the trials paused for good, once no trial can run anymore
+        """
+        return list(self.paused.values())
+
+
+def run(trials: list, number_of_episodes: int, track_name: str, controller_name: str = 'controller1',
+        bot_type: str = None, curriculum_name: str = None, workers: int = None, seed: int = None,
+        min_episodes: int = None, eta: int = 3, results_path: str = None, **options) -> list:
+    """
+    Runs trials in a pool of worker processes, reporting each of them as soon as it is over.
+
+    :param trials: options of each trial, as returned by grid or sample
+    :param number_of_episodes: number of learning episodes of each trial
+    :param track_name: track the trials learn on
+    :param curriculum_name: curriculum (see curriculum.CURRICULA) each trial follows over every track instead
+    :param workers: number of worker processes; defaults to the number of CPUs. With a single worker the trials run in
+                    the current process.
+    :param seed: trial i is seeded with seed + i
+    :param min_episodes: stops unpromising trials early with successive halving (see SuccessiveHalving), starting with
+                         rungs of min_episodes episodes; None to run every trial to the end
+    :param eta: reduction factor of successive halving
+    :param results_path: CSV file receiving the results table, ./results/sweep_<date>.csv by default
+    :param options: controller options shared by every trial, overridden by the trial options
+    :return: the Trial of every trial, the ones run to the end first, from the best evaluation score to the worst
+    """
+    stamp = datetime.datetime.fromtimestamp(time.time()).strftime('%Y%m%d%H%M%S')
+    if results_path is None:
+        results_path = "./results/sweep_%s.csv" % stamp
+    scheduler = SuccessiveHalving([Trial(number, trial_options, "./params/sweep_%s_%d.txt" % (stamp, number))
+                                   for number, trial_options in enumerate(trials)], number_of_episodes, min_episodes,
+                                  eta)
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = min(workers, len(trials))
+
+    def job(trial, episodes):
+        return (trial, episodes, options, controller_name, track_name, bot_type, curriculum_name, number_of_episodes,
+                seed)
+
+    def report(trial):
+        scheduler.update(trial)
+        if trial.evaluation_score is not None:
+            print("trial %d %s: final %.1f, evaluation %.1f, %.1f episodes/s (%d/%d over)"
+                  % (trial.number, trial.options, trial.final_score, trial.evaluation_score, trial.episodes_per_second,
+                     len(scheduler.finished), len(trials)))
+        else:
+            print("trial %d %s: rolling score %.1f after %d episodes"
+                  % (trial.number, trial.options, trial.final_score, len(trial.scores)))
+
+    start = time.perf_counter()
+    if workers <= 1:
+        next_run = scheduler.next_run()
+        while next_run is not None:
+            report(run_trial(job(*next_run)))
+            next_run = scheduler.next_run()
+    else:
+        with simulator.headless_pool(ProcessPoolExecutor, workers) as pool:
+            running = set()
+            while True:
+                while len(running) < workers:
+                    next_run = scheduler.next_run()
+                    if next_run is None:
+                        break
+                    running.add(pool.submit(run_trial, job(*next_run)))
+                if not running:
+                    break
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    report(future.result())
+    seconds = time.perf_counter() - start
+
+    stopped = sorted(scheduler.stopped(), key=lambda trial: (len(trial.scores), trial.final_score), reverse=True)
+    results = sorted(scheduler.finished, key=lambda trial: trial.evaluation_score, reverse=True) + stopped
+    save_results(results, results_path)
+    episodes = sum(len(trial.scores) for trial in results)
+    print("%d trials (%d stopped early) in %.1f s: %d episodes (%.0f%% of a full sweep), %.1f episodes/s, results saved "
+          "to %s" % (len(results), len(stopped), seconds, episodes, 100 * episodes / (len(trials) * number_of_episodes),
+                     episodes / seconds, results_path))
+    return results
+
+
+def save_results(results: list, path: str) -> None:
+    """
+    Writes one row per trial: its options, scores, throughput and table (left empty for trials stopped early).
+    """
+    option_names = list(dict.fromkeys(option for trial in results for option in trial.options))
+    with open(path, "w", newline='') as csv_file:
+        writer = csv.writer(csv_file, delimiter=',')
+        writer.writerow(["trial"] + option_names + ["episodes", "final_score", "best_score", "evaluation_score",
+                                                    "seconds", "episodes_per_second", "frames_per_second", "table"])
+        for trial in results:
+            over = trial.evaluation_score is not None
+            writer.writerow([trial.number] + [trial.options.get(option) for option in option_names] +
+                            [len(trial.scores), trial.final_score, max(trial.scores), trial.evaluation_score,
+                             trial.seconds, trial.episodes_per_second, trial.frames_per_second,
+                             trial.table_path if over else None])
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True)
+def repository_root(monkeypatch):
+    # Tracks and sprites are loaded from paths relative to the repository root
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.fixture
+def learning_outputs():
+    # Learning runs save tables to params/ and their progress to results/: remove what a test leaves there
+    def outputs():
+        return {os.path.join(directory, name) for directory in ('params', 'results')
+                for name in os.listdir(os.path.join(ROOT, directory))}
+
+    before = outputs()
+    yield
+    for path in outputs() - before:
+        os.remove(os.path.join(ROOT, path))
@@ -0,0 +1,37 @@
+import subprocess
+import sys
+
+import checkpoint
+
+
+def _learn(*arguments: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, 'AIRacers.py', '-t', 'baby_park', '--csv', 'test_checkpoint'] +
+                          list(arguments) + ['learn'], capture_output=True, text=True, timeout=120)
+
+
+def test_resume_time_budget_only(tmp_path, learning_outputs):
+    path = str(tmp_path / 'run.ckpt')
+    first = _learn('--time-budget', '2', '--checkpoint', path)
+    assert first.returncode == 0, first.stderr
+    saved = checkpoint.load(path)
+    assert saved['number_of_episodes'] is None
+    assert saved['time_left'] is not None
+
+    # The run goes on within what was left of its budget, without --time-budget nor -e
+    resumed = _learn('--resume', path)
+    assert resumed.returncode == 0, resumed.stderr
+    assert checkpoint.load(path)['episode_count'] >= saved['episode_count']
+
+
+def test_resume_without_episodes_nor_budget(tmp_path, learning_outputs):
+    path = str(tmp_path / 'run.ckpt')
+    first = _learn('--time-budget', '2', '--checkpoint', path)
+    assert first.returncode == 0, first.stderr
+    saved = checkpoint.load(path)
+    # Checkpoints written before the time left was saved
+    del saved['time_left']
+    checkpoint.Checkpoint(path).write(saved)
+
+    resumed = _learn('--resume', path)
+    assert resumed.returncode != 0
+    assert '-e or --time-budget' in resumed.stderr
@@ -0,0 +1,19 @@
+import numpy as np
+
+from controller1.convergence import ConvergenceMonitor
+
+
+def test_greedy_changes_among_states_visited_in_the_episode():
+    monitor = ConvergenceMonitor(patience=1)
+    q_values = np.zeros((100, 5))
+    # Every state was visited in earlier episodes
+    visits = np.full(100, 10)
+
+    monitor.start_episode(q_values, visits)
+    visits[:2] += 1
+    q_values[0, 3] = 1.0
+    monitor.end_episode(q_values, visits)
+
+    # One of the two states visited in the episode changed its greedy action
+    assert monitor.last[2] == 0.5
+    assert not monitor.converged
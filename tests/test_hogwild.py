@@ -0,0 +1,45 @@
+import multiprocessing
+
+import numpy as np
+
+import hogwild
+from controller1.qtable import SharedQTable
+
+
+def test_locked_states_holds_every_touched_stripe():
+    shared = SharedQTable(lock_stripes=4)
+    try:
+        with shared.locked_states(np.array([9, 2, 5, 13])):
+            assert _held(shared.locks) == [False, True, True, False]
+        assert _held(shared.locks) == [False] * 4
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def _held(locks: list) -> list:
+    held = []
+    for lock in locks:
+        acquired = lock.acquire(block=False)
+        if acquired:
+            lock.release()
+        held.append(not acquired)
+    return held
+
+
+def test_trace_updates_under_lock_stripes():
+    # Two workers updating overlapping traces must neither deadlock nor lose the table
+    process = multiprocessing.get_context('fork').Process(target=_train_with_traces)
+    process.start()
+    process.join(timeout=120)
+    deadlocked = process.is_alive()
+    if deadlocked:
+        process.kill()
+    assert not deadlocked
+    assert process.exitcode == 0
+
+
+def _train_with_traces():
+    q_table = hogwild.train('track1', 8, workers=2, lock_stripes=2, seed=0, trace_decay=0.8)
+    assert np.isfinite(q_table.q_table).all()
+    assert q_table.q_table.any()
@@ -0,0 +1,33 @@
+import pytest
+
+import kernels
+import tracks_config as track
+
+BACKENDS = [backend if backend != 'numba' or kernels.HAS_NUMBA else
+            pytest.param(backend, marks=pytest.mark.skip(reason="numba is not installed"))
+            for backend in ('python', 'numpy', 'numba')]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('track_name', [a_track.name for a_track in track.track.track_list])
+def test_backend_parity(track_name, backend):
+    assert kernels.check_track_parity(track_name, [backend]) == []
+
+
+@pytest.mark.skipif(not kernels.HAS_NUMBA, reason="numba is not installed")
+def test_warm_up_compiles_every_specialization():
+    import simulator
+    import trackcache
+
+    kernels.set_backend('numba')
+    kernels.warm_up()
+    compiled = [len(kernel.signatures) for kernel in kernels._backend('numba')]
+
+    a_track = track.track.track_list[0]
+    # Tracks built from their image as well as memory-mapped caches
+    for data in (trackcache.build(a_track, simulator.width, simulator.height),
+                 trackcache.load_or_build(a_track, simulator.width, simulator.height)):
+        kernels.lookup(data.classes, 0)
+        kernels.sonar(data.classes, 10.0, 10.0, 0.0, simulator.width, simulator.height, distances=data.distances)
+        kernels.sonar(data.classes, 10.0, 10.0, 0.0, simulator.width, simulator.height)
+    assert [len(kernel.signatures) for kernel in kernels._backend('numba')] == compiled
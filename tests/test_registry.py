@@ -0,0 +1,46 @@
+import subprocess
+import sys
+
+import interfaces
+import registry
+
+
+class Scripted(interfaces.Controller):
+    # Races, but does not implement update_q
+    def act(self, sensors_batch: list) -> list:
+        return [3] * len(sensors_batch)
+
+
+def _run(*arguments: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, 'AIRacers.py', '--csv', 'test_registry'] + list(arguments),
+                          capture_output=True, text=True, timeout=120)
+
+
+def test_accepted_options():
+    options = {'atten': 0.8, 'alpha': 0.3, 'init_temp': 50.0, 'strategy': 'boltzmann'}
+    assert registry.accepted_options('controller1', options) == options
+    assert registry.accepted_options('controller2', options) == {}
+    # The planner hands its options over to the controller it wraps
+    assert registry.accepted_options('planner', options) == options
+
+
+def test_can_learn():
+    assert registry.can_learn('controller1')
+    assert registry.can_learn('controller2')
+    assert not registry.can_learn('tests.test_registry:Scripted')
+
+
+def test_learn_controller2(learning_outputs):
+    learned = _run('-e', '1', '-c', 'controller2', 'learn')
+    assert learned.returncode == 0, learned.stderr
+
+
+def test_controllers_which_cannot_learn(learning_outputs):
+    for arguments, message in [
+            (('-c', 'tests.test_registry:Scripted', 'learn'), 'cannot learn'),
+            (('-c', 'tests.test_registry:Scripted', 'pbt'), 'cannot learn'),
+            (('-j', '2', '-c', 'controller2', 'learn'), 'cannot learn with several workers'),
+            (('-c', 'controller2', 'sweep', 'alpha=0.1,0.5'), 'does not take the searched options: alpha')]:
+        failed = _run('-e', '1', *arguments)
+        assert failed.returncode == 2
+        assert message in failed.stderr
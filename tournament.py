@@ -0,0 +1,172 @@
+"""
+This module runs competitions between controllers.
+
+Every race of a tournament (track x side x seed) is independent from the others, so races are spread over a pool of
+headless worker processes and only their final scores travel back to the parent process. Points are awarded with the
+same rule used by the competition mode: 3 points for the winner of each race and none for a tie.
+"""
+import itertools
+import multiprocessing
+import random
+
+import numpy as np
+
+import registry
+import simulator
+import tracks_config as track
+
+POINTS_PER_WIN = 3
+
+
+class Submission:
+    def __init__(self, name: str, controller: str, table_path: str = None, **options):
+        """
+        A controller taking part in a tournament. Workers build their own instance of it for every race.
+
+        :param name: Name used to report results
+        :param controller: Name of the controller in the registry (see registry.get_factory)
+        :param table_path: Q-table raced by the controller; by default, the one registered with the controller
+        :param options: Any other argument the controller factory requires
+        """
+        self.name = name
+        self.controller = controller
+        self.table_path = table_path if table_path is not None else registry.default_table(controller)
+        self.options = options
+
+    def build(self):
+        """
+        :return: a fresh controller for this submission
+        """
+        return registry.create(self.controller, self.table_path, **self.options)
+
+
+class RaceResult:
+    def __init__(self, player_1: str, player_2: str, track_name: str, switched: bool, seed: int, score_1: float,
+                 score_2: float):
+        """
+        Outcome of a single race.
+
+        :param switched: True if the players raced from each other's starting positions
+        :param seed: seed used for the bomb layout, None if it was left random
+        """
+        self.player_1 = player_1
+        self.player_2 = player_2
+        self.track_name = track_name
+        self.switched = switched
+        self.seed = seed
+        self.score_1 = score_1
+        self.score_2 = score_2
+
+    @property
+    def winner(self) -> str:
+        """
+        :return: name of the winner, None on ties
+        """
+        if self.score_1 > self.score_2:
+            return self.player_1
+        elif self.score_1 < self.score_2:
+            return self.player_2
+        return None
+
+
+def race_matrix(player_1: Submission, player_2: Submission, track_names: list = None, seeds: list = None) -> list:
+    """
+    Lists every race of a match: each track is raced once from each side, for each seed.
+
+    :param track_names: tracks to race on, every track of tracks_config by default
+    :param seeds: seeds for the bomb layouts, a single random layout per race by default
+    :return: list of race descriptions accepted by run_race
+    """
+    if track_names is None:
+        track_names = [a_track.name for a_track in track.track.track_list]
+    if not seeds:
+        seeds = [None]
+    return [(player_1, player_2, track_name, switched, seed)
+            for switched in (False, True) for track_name in track_names for seed in seeds]
+
+
+def run_race(race: tuple) -> RaceResult:
+    """
+    Runs a race described by race_matrix in the current process.
+    """
+    player_1, player_2, track_name, switched, seed = race
+    current_track = track.track.get_track(track_name)
+
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+
+    if switched:
+        current_track.car1_position, current_track.car2_position = \
+            current_track.car2_position, current_track.car1_position
+    try:
+        sim = simulator.Simulation(current_track, 'player2', ['tournament'])
+        sim.evaluate_comp(player_1.build(), player_2.build())
+    finally:
+        if switched:
+            current_track.car1_position, current_track.car2_position = \
+                current_track.car2_position, current_track.car1_position
+
+    return RaceResult(player_1.name, player_2.name, track_name, switched, seed, sim.car1.score, sim.car_bot.score)
+
+
+def run_races(races: list, workers: int = None) -> list:
+    """
+    Runs races headlessly in a pool of worker processes.
+
+    :param races: race descriptions, as returned by race_matrix
+    :param workers: number of worker processes; defaults to the number of CPUs. With a single worker the races run in
+                    the current process, keeping whatever rendering setting the simulator has.
+    :return: list of RaceResult, in the same order as races
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = min(workers, len(races))
+
+    if workers <= 1:
+        return [run_race(race) for race in races]
+
+    with simulator.headless_pool(multiprocessing.Pool, workers) as pool:
+        return pool.map(run_race, races, chunksize=1)
+
+
+def award_points(results: list) -> dict:
+    """
+    :param results: list of RaceResult
+    :return: dictionary mapping each player name to the points it received
+    """
+    points = {}
+    for result in results:
+        points.setdefault(result.player_1, 0)
+        points.setdefault(result.player_2, 0)
+        if result.winner is not None:
+            points[result.winner] += POINTS_PER_WIN
+    return points
+
+
+def play_match(player_1: Submission, player_2: Submission, track_names: list = None, seeds: list = None,
+               workers: int = None) -> (dict, list):
+    """
+    Races two submissions against each other on every track, from both sides.
+
+    :return: a tuple containing the points of each player and the list of RaceResult
+    """
+    results = run_races(race_matrix(player_1, player_2, track_names, seeds), workers)
+    return award_points(results), results
+
+
+def round_robin(submissions: list, track_names: list = None, seeds: list = None, workers: int = None) -> (dict, list):
+    """
+    Races every pair of submissions against each other. All races of all matches share a single worker pool.
+
+    :param submissions: list of Submission, with unique names
+    :return: a tuple containing the points of each submission and the list of RaceResult
+    """
+    races = []
+    for player_1, player_2 in itertools.combinations(submissions, 2):
+        races.extend(race_matrix(player_1, player_2, track_names, seeds))
+
+    results = run_races(races, workers)
+    points = {submission.name: 0 for submission in submissions}
+    points.update(award_points(results))
+    return points, results
@@ -126,3 +126,14 @@ class Track:
     @timeout.setter
     def timeout(self,value: int):
         self._timeout = value
+
+
+def get_track(name: str) -> Track:
+    """
+    :param name: name of a track (the tracks of the game are defined when tracks_config is imported)
+    :return: the corresponding Track object
+    """
+    for a_track in track_list:
+        if a_track.name == name:
+            return a_track
+    raise ValueError("Unknown track: %s" % name)
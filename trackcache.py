@@ -0,0 +1,127 @@
+"""
+This module bakes the masks of the tracks into cache files, so that simulations don't need to decode and resize images.
+
+For a mask 'assets/track.png' and the current CACHE_VERSION, three files are written next to it:
+
+    track.png.v1.classes.npy    the colour class of each pixel (see kernels.classify_colors), memory-mapped on load
+    track.png.v1.distances.npy  the distance field of the class map (see kernels.distance_field), memory-mapped on load
+    track.png.v1.npz            metadata: hash of the mask, size, palette and checkpoint geometry of the track
+
+Masks are resized to the size of the simulation and every pixel is quantized to the closest palette colour, so
+resampling blends along the borders get a class too. A cache is only used while its metadata matches the mask file and
+the track definition; otherwise (or when there is none) the same data is computed from the mask, which is slower.
+
+Example:
+    To (re)build the cache of every track:
+
+        $ python AIRacers.py prepare-tracks
+"""
+import hashlib
+import os
+
+import numpy as np
+
+import kernels
+
+CACHE_VERSION = 1
+
+
+class TrackData:
+    def __init__(self, classes: np.ndarray, distances: np.ndarray, width: int, height: int, cached: bool):
+        """
+        Preprocessed mask of a track.
+
+        :param classes: flat uint8 class map, in the order of PIL's getdata()
+        :param distances: flat uint8 distance field of classes
+        :param cached: True if the data was read from the cache files
+        """
+        self.classes = kernels.read_only(classes)
+        self.distances = kernels.read_only(distances)
+        self.width = width
+        self.height = height
+        self.cached = cached
+
+
+def cache_paths(track) -> (str, str, str):
+    """
+    :param track: a track.Track
+    :return: paths of the class map, distance field and metadata files of the track
+    """
+    prefix = "%s.v%d" % (track.mask_img_path, CACHE_VERSION)
+    return prefix + '.classes.npy', prefix + '.distances.npy', prefix + '.npz'
+
+
+def _mask_hash(track) -> str:
+    with open(track.mask_img_path, 'rb') as mask:
+        return hashlib.sha1(mask.read()).hexdigest()
+
+
+def _metadata(track, width: int, height: int) -> dict:
+    return {
+        'version': np.array(CACHE_VERSION),
+        'mask_sha1': np.array(_mask_hash(track)),
+        'size': np.array([width, height]),
+        'palette': np.array([color + (color_class,) for color, color_class in kernels.PALETTE.items()]),
+        'checkpoints': np.array(track.checkpoints, dtype=np.float64).reshape(-1, 4),
+    }
+
+
+def build(track, width: int, height: int) -> TrackData:
+    """
+    Computes the preprocessed mask of a track from its image.
+
+    :param track: a track.Track
+    :param width: simulation width
+    :param height: simulation height
+    """
+    # Only needed without a cache
+    from PIL import Image
+    image = Image.open(track.mask_img_path).resize((width, height)).convert('RGBA')
+    classes = kernels.classify_colors(np.asarray(image), nearest=True)
+    return TrackData(classes, kernels.distance_field(classes, width, height), width, height, False)
+
+
+def prepare(track, width: int, height: int) -> str:
+    """
+    Writes the cache files of a track, replacing any previous version.
+
+    :return: path of the metadata file
+    """
+    data = build(track, width, height)
+    classes_path, distances_path, metadata_path = cache_paths(track)
+    np.save(classes_path, data.classes)
+    np.save(distances_path, data.distances)
+    # Written last: a cache without metadata is never loaded
+    np.savez(metadata_path, **_metadata(track, width, height))
+    return metadata_path
+
+
+def load(track, width: int, height: int) -> TrackData:
+    """
+    :return: the cached preprocessed mask of a track, None if there is no cache or if it is out of date
+    """
+    classes_path, distances_path, metadata_path = cache_paths(track)
+    if not all(os.path.exists(path) for path in (classes_path, distances_path, metadata_path)):
+        return None
+
+    with np.load(metadata_path) as stored:
+        expected = _metadata(track, width, height)
+        if set(stored.files) != set(expected) or \
+                not all(np.array_equal(stored[key], value) for key, value in expected.items()):
+            return None
+
+    classes = np.load(classes_path, mmap_mode='r')
+    distances = np.load(distances_path, mmap_mode='r')
+    if classes.shape != (width * height,) or distances.shape != (width * height,):
+        return None
+    return TrackData(classes, distances, width, height, True)
+
+
+def load_or_build(track, width: int, height: int) -> TrackData:
+    """
+    :return: the cached preprocessed mask of a track, or a freshly computed one if the cache can't be used
+    """
+    data = load(track, width, height)
+    if data is None:
+        data = build(track, width, height)
+    return data
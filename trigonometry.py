@@ -5,17 +5,15 @@ def distance(line, point):
     p1 = line.get_vertices()[1]
     p2 = point
 
-    ax = p0[0]
-    ay = p0[1]
-    bx = p1[0]
-    by = p1[1]
-    cx = p2[0]
-    cy = p2[1]
+    return segment_distance(p0[0], p0[1], p1[0], p1[1], p2[0], p2[1])
 
+
+def segment_distance(ax, ay, bx, by, cx, cy):
     a = max(by - ay, 0.00001)
     b = max(ax - bx, 0.00001)
     # compute the perpendicular distance to the theoretical infinite line
-    dl = abs(a * cx + b * cy - b * ay - a * ax) / math.sqrt(a ** 2 + b ** 2)
+    # (squares are written as products: x ** 2 goes through libm's pow, whose rounding compiled kernels can't reproduce)
+    dl = abs(a * cx + b * cy - b * ay - a * ax) / math.sqrt(a * a + b * b)
     # compute the intersection point
     x = ((a / b) * ax + ay + (b / a) * cx - cy) / ((b / a) + (a / b))
     y = -1 * (a / b) * (x - ax) + ay
@@ -24,7 +22,21 @@ def distance(line, point):
         return dl
     else:
         # if it does not, then return the creamum distance to the segment endpoints
-        return min(math.sqrt((ax - cx) ** 2 + (ay - cy) ** 2), math.sqrt((bx - cx) ** 2 + (by - cy) ** 2))
+        return min(math.sqrt((ax - cx) * (ax - cx) + (ay - cy) * (ay - cy)),
+                   math.sqrt((bx - cx) * (bx - cx) + (by - cy) * (by - cy)))
+
+
+def segments_intersect(ax, ay, bx, by, cx, cy, dx, dy):
+    # orientation of a and b with respect to cd, and of c and d with respect to ab
+    d1 = (dx - cx) * (ay - cy) - (dy - cy) * (ax - cx)
+    d2 = (dx - cx) * (by - cy) - (dy - cy) * (bx - cx)
+    d3 = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+    d4 = (bx - ax) * (dy - ay) - (by - ay) * (dx - ax)
+    if d1 == 0 and d2 == 0:
+        # all on the same line (or ab is a point of that line): they touch if they overlap
+        return (min(ax, bx) <= max(cx, dx) and min(cx, dx) <= max(ax, bx) and
+                min(ay, by) <= max(cy, dy) and min(cy, dy) <= max(ay, by))
+    return d1 * d2 <= 0 and d3 * d4 <= 0
 
 
 def rad2deg(ang):